@@ -0,0 +1,155 @@
+"""
+Benchmarks for the proxy pipeline's data handling
+Usage: python benchmark.py {memory,load} [proxies.json] [--scale N]
+Without a file, parses working_configs/by_protocol/*.txt as the corpus.
+"""
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import tempfile
+import resource
+import subprocess
+import tracemalloc
+
+from utils import parse_proxy_url, pack_proxies, unpack_proxies
+from interchange import FORMAT_FILES, ProxyWriter, iter_proxies
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_corpus(path: str = None) -> str:
+    """Proxy list as the JSON text test.py would load"""
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    proxies = []
+    for txt in sorted(glob.glob(os.path.join(BASE_DIR, 'working_configs', 'by_protocol', '*.txt'))):
+        with open(txt, 'r', encoding='utf-8') as f:
+            proxies.extend(p for p in map(parse_proxy_url, f) if p)
+    return json.dumps(proxies, ensure_ascii=False)
+
+
+def measure(build):
+    """(result, bytes still allocated by build())"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def memory_report(text: str, scale: int = 1):
+    """Dicts from json.load vs ProxyRecords, per proxy and in total"""
+    if scale > 1:
+        text = json.dumps(json.loads(text) * scale, ensure_ascii=False)
+
+    dicts, dict_bytes = measure(lambda: json.loads(text))
+    count = len(dicts)
+    # Built from a fresh load so the records own their strings, not the dicts'
+    records, record_bytes = measure(lambda: pack_proxies(json.loads(text)))
+    lossless = unpack_proxies(records) == dicts
+    del dicts
+
+    print(f"\n{'='*70}")
+    print(f"PROXY MEMORY REPORT ({count} proxies)")
+    print(f"{'='*70}")
+    print(f"  {'Representation':<16} {'Total':>12} {'Per proxy':>12}")
+    print(f"  {'dict (json)':<16} {dict_bytes/1024/1024:>10.1f}MB {dict_bytes/count:>10.0f} B")
+    print(f"  {'ProxyRecord':<16} {record_bytes/1024/1024:>10.1f}MB {record_bytes/count:>10.0f} B")
+    print(f"  Saving: {(1 - record_bytes/dict_bytes)*100:.0f}%   Round trip lossless: {lossless}")
+    print(f"{'='*70}\n")
+
+
+def peak_rss_mb() -> float:
+    """
+    This process's own peak RSS. ru_maxrss survives fork and exec, so a
+    child would report its parent's high-water mark; VmHWM starts afresh.
+    """
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _load_child(path: str, how: str):
+    """Runs in a fresh interpreter so the peak RSS is this load's alone"""
+    start = time.perf_counter()
+    if how == 'json.load':
+        with open(path, 'r', encoding='utf-8') as f:
+            count = len(json.load(f))
+    elif how == 'stream':
+        count = sum(1 for _ in iter_proxies(path))
+    else:
+        count = len(list(iter_proxies(path)))
+    print(json.dumps({
+        'seconds': time.perf_counter() - start,
+        'peak_rss_mb': peak_rss_mb(),
+        'count': count
+    }))
+
+
+def load_report(text: str, scale: int = 1):
+    """Load time and peak RSS of each interchange format"""
+    proxies = json.loads(text) * scale
+    runs = [('json', 'json.load'), ('json', 'list'), ('ndjson', 'list'),
+            ('ndjson', 'stream'), ('ndjson.gz', 'list'), ('ndjson.gz', 'stream')]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sizes = {}
+        for fmt, name in FORMAT_FILES.items():
+            path = os.path.join(tmp, fmt, name)
+            os.makedirs(os.path.dirname(path))
+            if fmt == 'json':
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump(proxies, f, indent=2, ensure_ascii=False)
+            else:
+                with ProxyWriter(path) as writer:
+                    for proxy in proxies:
+                        writer.write(proxy)
+            sizes[fmt] = (path, os.path.getsize(path))
+        del proxies
+
+        print(f"\n{'='*70}")
+        print(f"INTERCHANGE LOAD REPORT ({len(json.loads(text)) * scale} proxies)")
+        print(f"{'='*70}")
+        print(f"  {'Format':<10} {'Reader':<10} {'Size':>9} {'Load':>9} {'Peak RSS':>10}")
+        for fmt, how in runs:
+            path, size = sizes[fmt]
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), '_load', path, how],
+                                 capture_output=True, text=True, check=True).stdout
+            r = json.loads(out)
+            print(f"  {fmt:<10} {how:<10} {size/1024/1024:>7.1f}MB {r['seconds']:>8.2f}s "
+                  f"{r['peak_rss_mb']:>8.0f}MB")
+        print(f"  stream = iterate without keeping proxies, as a consumer that dedupes/tests on the fly")
+        print(f"{'='*70}\n")
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == '_load':
+        _load_child(sys.argv[2], sys.argv[3])
+        return
+
+    parser = argparse.ArgumentParser(description='Pipeline data benchmarks')
+    parser.add_argument('bench', choices=['memory', 'load'])
+    parser.add_argument('file', nargs='?', help='proxy list JSON (default: parse by_protocol/*.txt)')
+    parser.add_argument('--scale', type=int, default=1, help='repeat the corpus N times')
+    args = parser.parse_args()
+
+    text = load_corpus(args.file)
+    if args.bench == 'memory':
+        memory_report(text, max(1, args.scale))
+    else:
+        load_report(text, max(1, args.scale))
+
+
+if __name__ == '__main__':
+    main()
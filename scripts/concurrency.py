@@ -0,0 +1,185 @@
+"""
+Adaptive concurrency control for the tester
+Raises or lowers in-flight tests from CPU, memory, FD and timeout pressure
+"""
+import os
+import time
+import threading
+from typing import Dict, Optional, Tuple
+
+ADAPTIVE = os.environ.get('ADAPTIVE', '0') == '1'
+ADAPTIVE_MIN = int(os.environ.get('ADAPTIVE_MIN', 20))
+ADAPTIVE_MAX = int(os.environ.get('ADAPTIVE_MAX', 400))
+ADAPTIVE_INTERVAL = float(os.environ.get('ADAPTIVE_INTERVAL', 5))
+ADAPTIVE_MAX_CPU = float(os.environ.get('ADAPTIVE_MAX_CPU', 0.9))             # busy share over an interval
+ADAPTIVE_MAX_LOAD = float(os.environ.get('ADAPTIVE_MAX_LOAD', 1.5))           # load avg per CPU, without /proc/stat
+ADAPTIVE_MIN_FREE_MB = int(os.environ.get('ADAPTIVE_MIN_FREE_MB', 512))
+ADAPTIVE_MAX_FD_RATIO = float(os.environ.get('ADAPTIVE_MAX_FD_RATIO', 0.8))
+# Dead proxies time out at any concurrency, so only a rise over the run's own
+# running timeout rate counts as pressure: one that eats this share of the
+# non-timeout headroom (baseline 30% -> pressure above 65%, 85% -> above 92.5%)
+ADAPTIVE_TIMEOUT_MARGIN = float(os.environ.get('ADAPTIVE_TIMEOUT_MARGIN', 0.5))
+ADAPTIVE_BASELINE_ALPHA = float(os.environ.get('ADAPTIVE_BASELINE_ALPHA', 0.1))
+ADAPTIVE_MIN_WINDOW = 20  # Results a window needs for its timeout rate to mean something
+
+
+def available_memory_mb() -> Optional[float]:
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except Exception:
+        pass
+    return None
+
+
+def open_fd_ratio() -> Optional[float]:
+    try:
+        import resource
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+        return len(os.listdir('/proc/self/fd')) / soft
+    except Exception:
+        return None
+
+
+def cpu_times() -> Optional[Tuple[int, int]]:
+    """(busy, total) jiffies across all CPUs since boot, from /proc/stat"""
+    try:
+        with open('/proc/stat', 'r') as f:
+            fields = [int(v) for v in f.readline().split()[1:]]
+        idle = fields[3] + fields[4]  # idle + iowait
+        total = sum(fields[:8])  # guest time is already counted in user/nice
+        return total - idle, total
+    except Exception:
+        return None
+
+
+def load_per_cpu() -> Optional[float]:
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except Exception:
+        return None
+
+
+class ConcurrencyController:
+    """
+    Counting gate whose limit can move at runtime.
+    With `adaptive`, a monitor thread samples system pressure every
+    `interval` seconds: any pressure cuts the limit by a quarter, a calm
+    interval raises it by a step (AIMD), always within [floor, ceiling].
+    """
+
+    def __init__(self, initial: int, floor: int, ceiling: int,
+                 adaptive: bool = False, interval: float = ADAPTIVE_INTERVAL):
+        self.floor = max(1, min(floor, ceiling))
+        self.ceiling = max(self.floor, ceiling)
+        self.limit = max(self.floor, min(initial, self.ceiling))
+        self.adaptive = adaptive
+        self.interval = interval
+        self.step = max(1, self.ceiling // 20)
+        self.active = 0
+        self.cond = threading.Condition()
+        self.window_done = 0
+        self.window_timeouts = 0
+        self.timeout_baseline = None  # Slow moving average of window timeout rates
+        self.cpu_last = cpu_times()
+        self.trajectory = []
+        self.started = time.time()
+        self.stop_event = threading.Event()
+        self.monitor = None
+
+    def acquire(self):
+        with self.cond:
+            while self.active >= self.limit:
+                self.cond.wait()
+            self.active += 1
+
+    def release(self, timed_out: bool = False):
+        with self.cond:
+            self.active -= 1
+            self.window_done += 1
+            self.window_timeouts += int(timed_out)
+            self.cond.notify()
+
+    def start(self):
+        self._log(self.limit, self.sample(), 'start')
+        if self.adaptive:
+            self.monitor = threading.Thread(target=self._monitor_loop, daemon=True)
+            self.monitor.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.monitor:
+            self.monitor.join(timeout=self.interval + 1)
+
+    def sample(self) -> Dict:
+        with self.cond:
+            done, timeouts = self.window_done, self.window_timeouts
+            self.window_done = self.window_timeouts = 0
+        rate = timeouts / done if done else None
+        # CPU is measured over this interval only. The load average lags by
+        # about a minute, so it kept cutting long after a spike had passed
+        cpu, busy = cpu_times(), None
+        if cpu and self.cpu_last and cpu[1] > self.cpu_last[1]:
+            busy = (cpu[0] - self.cpu_last[0]) / (cpu[1] - self.cpu_last[1])
+        self.cpu_last = cpu
+        baseline = self.timeout_baseline
+        if rate is not None and done >= ADAPTIVE_MIN_WINDOW:
+            self.timeout_baseline = rate if baseline is None else (
+                baseline + ADAPTIVE_BASELINE_ALPHA * (rate - baseline))
+        return {
+            'cpu_busy': busy,
+            'load_per_cpu': load_per_cpu() if cpu is None else None,
+            'free_mb': available_memory_mb(),
+            'fd_ratio': open_fd_ratio(),
+            'timeout_rate': rate,
+            'timeout_baseline': baseline,  # Before this window was folded in
+            'completed': done,
+        }
+
+    def pressure(self, s: Dict) -> Optional[str]:
+        """Name of the first resource under pressure, or None"""
+        if s['cpu_busy'] is not None and s['cpu_busy'] > ADAPTIVE_MAX_CPU:
+            return 'cpu'
+        if s['load_per_cpu'] is not None and s['load_per_cpu'] > ADAPTIVE_MAX_LOAD:
+            return 'load'
+        if s['free_mb'] is not None and s['free_mb'] < ADAPTIVE_MIN_FREE_MB:
+            return 'memory'
+        if s['fd_ratio'] is not None and s['fd_ratio'] > ADAPTIVE_MAX_FD_RATIO:
+            return 'fds'
+        if (s['timeout_baseline'] is not None and s['completed'] >= ADAPTIVE_MIN_WINDOW
+                and s['timeout_rate'] > s['timeout_baseline']
+                + ADAPTIVE_TIMEOUT_MARGIN * (1 - s['timeout_baseline'])):
+            return 'timeouts'
+        return None
+
+    def _monitor_loop(self):
+        while not self.stop_event.wait(self.interval):
+            s = self.sample()
+            reason = self.pressure(s)
+            with self.cond:
+                old = self.limit
+                if reason:
+                    self.limit = max(self.floor, int(self.limit * 0.75))
+                elif self.active >= self.limit - self.step:
+                    # Only grow when the current limit is actually being used
+                    self.limit = min(self.ceiling, self.limit + self.step)
+                new = self.limit
+                self.cond.notify_all()
+            if new != old:
+                self._log(new, s, reason or 'headroom')
+
+    def _log(self, limit: int, s: Dict, reason: str):
+        entry = {'t': round(time.time() - self.started, 1), 'limit': limit, 'reason': reason}
+        entry.update({k: round(v, 3) if isinstance(v, float) else v for k, v in s.items()})
+        self.trajectory.append(entry)
+        if self.adaptive:
+            fmt = lambda v, spec: format(v, spec) if v is not None else 'n/a'
+            print(f"\n  [concurrency] t={entry['t']}s limit={limit} ({reason}) "
+                  + (f"cpu={fmt(s['cpu_busy'], '.0%')} " if s['load_per_cpu'] is None
+                     else f"load/cpu={fmt(s['load_per_cpu'], '.2f')} ") +
+                  f"free={fmt(s['free_mb'], '.0f')}MB "
+                  f"fds={fmt(s['fd_ratio'], '.0%')} "
+                  f"timeouts={fmt(s['timeout_rate'], '.0%')} "
+                  f"(baseline {fmt(s['timeout_baseline'], '.0%')})")
@@ -11,11 +11,19 @@ Then it generates metadata for GitHub Actions.
 import os
 import sys
 import json
+import time
 import base64
+import hashlib
 import pathlib
+import queue
+import threading
+import urllib.parse
 import requests
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, TimeoutError
 from datetime import datetime
-from utils import parse_proxy_url, calculate_proxy_hash
+from utils import calculate_proxy_hash
+from parse_engine import parse_unique, parser_version, ParseMemo
+from interchange import PARSED_FORMAT, ProxyWriter, parsed_path, remove_stale
 
 BASE_DIR = pathlib.Path(__file__).resolve().parent
 TEMP_DIR = BASE_DIR.parent / "temp_configs"
@@ -25,6 +33,15 @@ SUB_FILE = BASE_DIR.parent / "sub.txt"
 TEMP_DIR.mkdir(exist_ok=True)
 WORKING_DIR.mkdir(exist_ok=True)
 
+USER_AGENT = "ClashConfigTester/1.0 (+https://github.com/)"
+DOWNLOAD_WORKERS = int(os.environ.get("DOWNLOAD_WORKERS", 16))
+SOURCE_TIMEOUT = float(os.environ.get("SOURCE_TIMEOUT", 60))   # Per-source deadline
+PHASE_TIMEOUT = float(os.environ.get("PHASE_TIMEOUT", 600))    # Whole download phase
+SUB_CACHE_DIR = TEMP_DIR / "sub_cache"
+SUB_CACHE_ENABLED = os.environ.get("SUB_CACHE", "1") != "0"
+PARSE_MEMO_PATH = TEMP_DIR / "parse_memo.json"
+PARSE_MEMO_ENABLED = os.environ.get("PARSE_MEMO", "1") != "0"
+
 
 def decode_base64(data: str) -> str:
     """Decode base64 safely"""
@@ -38,31 +55,74 @@ def decode_base64(data: str) -> str:
         return ""
 
 
-def fetch_subscription(url: str) -> str:
-    """Download subscription content from URL"""
+def fetch_subscription(url: str, session: requests.Session = None,
+                       timeout: float = 120, deadline: float = None,
+                       cached: dict = None) -> tuple[str, dict]:
+    """
+    Download subscription content from URL.
+    The body is streamed so `deadline` (a time.monotonic() value) bounds
+    the whole transfer, not just each socket operation.
+    When `cached` holds ETag/Last-Modified validators the request is
+    conditional and a 304 comes back as an empty body.
+    Returns (text, info) where info holds per-source timing.
+    """
+    url = url.strip()
+    started = time.monotonic()
+    deadline = min(deadline or float("inf"), started + timeout)
+    info = {"url": url, "status": None, "bytes": 0, "seconds": 0.0, "error": None,
+            "etag": None, "last_modified": None, "digest": None}
+    session = session or requests
+
+    headers = {"User-Agent": USER_AGENT}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
     try:
-        headers = {
-            "User-Agent": "ClashConfigTester/1.0 (+https://github.com/)"
-        }
-        resp = requests.get(url.strip(), headers=headers, timeout=120)
-        if resp.status_code == 200:
-            return resp.text.strip()
-        print(f"⚠️ Failed to fetch ({resp.status_code}): {url}")
-        return ""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("phase deadline reached")
+        resp = session.get(url, headers=headers, timeout=remaining, stream=True)
+        info["status"] = resp.status_code
+        info["etag"] = resp.headers.get("ETag")
+        info["last_modified"] = resp.headers.get("Last-Modified")
+        with resp:
+            if resp.status_code == 304:
+                return "", info
+            if resp.status_code != 200:
+                print(f"⚠️ Failed to fetch ({resp.status_code}): {url}")
+                return "", info
+
+            chunks = []
+            for chunk in resp.iter_content(chunk_size=65536):
+                chunks.append(chunk)
+                info["bytes"] += len(chunk)
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"deadline exceeded after {info['bytes']} bytes")
+
+            body = b"".join(chunks)
+            info["digest"] = hashlib.sha256(body).hexdigest()
+            encoding = resp.encoding or "utf-8"
+            return body.decode(encoding, errors="ignore").strip(), info
     except Exception as e:
-        print(f"❌ Error downloading {url}: {e}")
-        return ""
+        info["error"] = str(e) or type(e).__name__
+        print(f"❌ Error downloading {url}: {info['error']}")
+        return "", info
+    finally:
+        info["seconds"] = round(time.monotonic() - started, 3)
 
 
 def parse_subscription_data(data: str) -> list[str]:
     """Detects and parses subscription format"""
     proxies = []
-    protocols = ["vmess://", "vless://", "ss://", "trojan://"]
+    protocols = ("vmess://", "vless://", "ss://", "trojan://")
 
     # First, try to parse as plain text (look for proxy URLs anywhere in the content)
     for line in data.strip().splitlines():
         line_stripped = line.strip()
-        if any(line_stripped.startswith(p) for p in protocols):
+        if line_stripped.startswith(protocols):
             proxies.append(line_stripped)
 
     # If no proxies found, try base64 decoding
@@ -71,18 +131,19 @@ def parse_subscription_data(data: str) -> list[str]:
         if decoded:
             for line in decoded.strip().splitlines():
                 line_stripped = line.strip()
-                if any(line_stripped.startswith(p) for p in protocols):
+                if line_stripped.startswith(protocols):
                     proxies.append(line_stripped)
 
     return proxies
 
 
-def load_subscriptions() -> list[str]:
+def load_subscriptions(sub_file: pathlib.Path = SUB_FILE) -> list[str]:
     """Load subscription URLs from sub.txt"""
-    if not SUB_FILE.exists():
-        print("❌ sub.txt not found.")
+    sub_file = pathlib.Path(sub_file)
+    if not sub_file.exists():
+        print(f"❌ {sub_file.name} not found.")
         sys.exit(1)
-    with open(SUB_FILE, "r", encoding="utf-8") as f:
+    with open(sub_file, "r", encoding="utf-8") as f:
         urls = [line.strip() for line in f if line.strip() and not line.startswith("#")]
     print(f"📥 Found {len(urls)} subscription URLs.")
     return urls
@@ -116,55 +177,443 @@ def remove_duplicate_proxies(proxies: list) -> list:
     return unique_proxies
 
 
+class SubscriptionCache:
+    """
+    On-disk cache, one JSON file per subscription URL.
+    Holds the HTTP validators, a digest of the body, the proxy URLs found
+    in it and their parse results (None for rejected URLs), tagged with
+    the parser version that produced them.
+    """
+
+    def __init__(self, cache_dir: pathlib.Path = SUB_CACHE_DIR):
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.parser = parser_version()
+
+    def _path(self, url: str) -> pathlib.Path:
+        return self.cache_dir / f"{hashlib.sha1(url.strip().encode()).hexdigest()[:16]}.json"
+
+    def load(self, url: str) -> dict | None:
+        try:
+            with open(self._path(url), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            if entry.get("url") == url.strip() and len(entry["raw"]) == len(entry["parsed"]):
+                return entry
+        except Exception:
+            pass
+        return None
+
+    def save(self, url: str, info: dict, raw: list[str], parsed: list):
+        entry = {
+            "url": url.strip(),
+            "etag": info.get("etag"),
+            "last_modified": info.get("last_modified"),
+            "digest": info.get("digest"),
+            "saved": datetime.utcnow().isoformat() + "Z",
+            "parser": self.parser,
+            "raw": raw,
+            "parsed": parsed,
+        }
+        tmp = self._path(url).with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp, self._path(url))
+
+
+class SubscriptionDownloader:
+    """Concurrent subscription fetcher with per-host connection reuse"""
+
+    def __init__(self, max_workers: int = DOWNLOAD_WORKERS, retry_count: int = 2,
+                 timeout: float = SOURCE_TIMEOUT, phase_timeout: float = PHASE_TIMEOUT,
+                 use_cache: bool = SUB_CACHE_ENABLED, use_memo: bool = PARSE_MEMO_ENABLED):
+        self.max_workers = max(1, max_workers)
+        self.retry_count = max(0, retry_count)
+        self.timeout = timeout
+        self.phase_timeout = phase_timeout
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.source_stats = []
+        self.total_urls = 0
+        self.unique_count = 0
+        self.parsed_count = 0
+        self.failed_count = 0   # Accumulates over parse calls
+        self.cache = SubscriptionCache() if use_cache else None
+        self.seen = {}       # ParseMemo.key of each raw proxy URL parsed this run -> parsed ok
+        self.memo = ParseMemo(str(PARSE_MEMO_PATH)) if use_memo else None
+        self.pending = {}    # source URL -> (info, raw proxy URLs) to cache after parsing
+        self.preparsed = {}  # source URL -> (raw, parsed) from its cache entry, until parsed
+        self.raw_sources = {}  # raw proxy URL -> first source holding it (collected mode)
+
+    def _session(self, url: str) -> requests.Session:
+        """One keep-alive session per host"""
+        host = urllib.parse.urlsplit(url.strip()).netloc.lower()
+        with self.lock:
+            session = self.sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                        pool_maxsize=self.max_workers)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self.sessions[host] = session
+            return session
+
+    def read_subscription_urls(self, sub_file=SUB_FILE) -> list[str]:
+        return load_subscriptions(sub_file)
+
+    def fetch(self, url: str, deadline: float) -> tuple[list[str], dict]:
+        """Fetch and split one source, retrying while its own deadline allows"""
+        session = self._session(url)
+        cached = self.cache.load(url) if self.cache else None
+        # One SOURCE_TIMEOUT budget shared by every attempt, not one per attempt
+        deadline = min(deadline, time.monotonic() + self.timeout)
+        attempts = 0
+        while True:
+            attempts += 1
+            raw, info = fetch_subscription(url, session, self.timeout, deadline, cached)
+            retryable = info["error"] is not None or (info["status"] or 0) >= 500
+            if not retryable or attempts > self.retry_count or time.monotonic() >= deadline:
+                break
+            time.sleep(min(0.5 * attempts, max(0.0, deadline - time.monotonic())))
+        info["attempts"] = attempts
+
+        if cached and (info["status"] == 304 or
+                       (info["digest"] and info["digest"] == cached["digest"])):
+            # Unchanged source: reuse the cached split, and its parse unless
+            # the parser changed since, in which case it is parsed (and cached) again
+            info["cache"] = "not_modified" if info["status"] == 304 else "digest"
+            parsed = cached["raw"]
+            if cached.get("parser") == self.cache.parser:
+                with self.lock:
+                    self.preparsed[url] = (cached["raw"], cached["parsed"])
+                if info["status"] != 304 and (info["etag"] or info["last_modified"]):
+                    self.cache.save(url, info, cached["raw"], cached["parsed"])
+            else:
+                validators = dict(info) if info["status"] != 304 else dict(
+                    info, etag=cached.get("etag"), last_modified=cached.get("last_modified"),
+                    digest=cached.get("digest"))
+                with self.lock:
+                    self.pending[url] = (validators, parsed)
+        else:
+            info["cache"] = "miss"
+            parsed = parse_subscription_data(raw)
+            if self.cache and info["status"] == 200 and info["digest"]:
+                with self.lock:
+                    self.pending[url] = (dict(info), parsed)
+
+        info["proxies"] = len(parsed)
+        for key in ("etag", "last_modified", "digest"):
+            info.pop(key, None)
+        return parsed, info
+
+    def download_all_parallel(self, urls: list[str], on_sources=None) -> list[str]:
+        """
+        Download all sources with bounded concurrency, return raw proxy URLs.
+        With `on_sources(batch)` each source is handed over, as part of a
+        [(url, proxy_urls), ...] batch in `urls` order, as soon as it and
+        every source before it have finished, instead of being collected,
+        and nothing is returned.
+        """
+        phase_deadline = time.monotonic() + self.phase_timeout
+        results = {}
+        # Sources finished ahead of an earlier one wait here so they reach
+        # on_sources in sub.txt order and the same duplicate wins every run
+        order = list(dict.fromkeys(urls))
+        finished = {}
+        delivered = 0
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        futures = {executor.submit(self.fetch, url, phase_deadline): url for url in urls}
+        running = set(futures)
+        try:
+            while running:
+                # Whatever finished meanwhile (e.g. while on_sources blocked on
+                # a full test queue) is taken first: the deadline only abandons
+                # fetches still running, which bound themselves to it anyway
+                done, running = wait(running, timeout=0)
+                if not done:
+                    remaining = phase_deadline + 5 - time.monotonic()
+                    if remaining <= 0:
+                        print(f"⏱️ Phase deadline of {self.phase_timeout:.0f}s reached, "
+                              f"abandoning {len(running)} sources")
+                        break
+                    done, running = wait(running, timeout=remaining,
+                                         return_when=FIRST_COMPLETED)
+                for future in done:
+                    url = futures[future]
+                    try:
+                        parsed, info = future.result()
+                    except Exception as e:
+                        parsed, info = [], {"url": url, "error": str(e), "proxies": 0}
+                    print(f"→ {url}\n   ↳ Found {len(parsed)} proxy URLs "
+                          f"({info.get('seconds', 0):.1f}s)")
+                    if on_sources:
+                        finished[url] = parsed
+                        parsed = []
+                    results[url] = (parsed, info)
+                batch = []
+                while delivered < len(order) and order[delivered] in finished:
+                    batch.append((order[delivered], finished.pop(order[delivered])))
+                    delivered += 1
+                if batch:
+                    on_sources(batch)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        # Sources held back behind one that was abandoned
+        batch = [(url, finished.pop(url)) for url in order[delivered:] if url in finished]
+        if batch:
+            on_sources(batch)
+
+        # Keep sub.txt order so output is stable across runs
+        all_proxy_urls = []
+        self.source_stats = []
+        for url in urls:
+            parsed, info = results.get(url, ([], {"url": url, "error": "phase deadline",
+                                                   "proxies": 0}))
+            all_proxy_urls.extend(parsed)
+            for raw in parsed:
+                self.raw_sources.setdefault(raw, url)
+            self.source_stats.append(info)
+
+        self.total_urls = sum(s.get("proxies", 0) for s in self.source_stats)
+        return all_proxy_urls
+
+    def parse_new(self, proxy_urls, sources: list[str]) -> dict:
+        """
+        Parse the URLs in `proxy_urls` not seen earlier this run, once each
+        and across CPU cores for large inputs; `sources` are the source URLs
+        they came from. Returns raw URL -> parse result (None = rejected)
+        for those first sightings only: after that a URL is kept as a digest
+        in self.seen, so memory does not grow with the parsed proxies.
+        """
+        fresh = []
+        for raw in proxy_urls:
+            key = ParseMemo.key(raw)
+            if key not in self.seen:
+                self.seen[key] = None
+                fresh.append(raw)
+
+        # Unchanged sources bring their cached parse
+        with self.lock:
+            preparsed = [self.preparsed.pop(url) for url in sources if url in self.preparsed]
+        results = {}
+        for raw, parsed in preparsed:
+            results.update(zip(raw, parsed))
+        results = {raw: results[raw] for raw in fresh if raw in results}
+
+        todo = (raw for raw in fresh if raw not in results)
+        if self.memo:
+            found, todo = self.memo.lookup(todo)
+            parsed = parse_unique(todo)
+            self.memo.update(parsed)
+            results.update(found)
+            results.update(parsed)
+        else:
+            results.update(parse_unique(todo))
+        for raw in fresh:
+            self.seen[ParseMemo.key(raw)] = results[raw] is not None
+
+        # Cache the parse of every changed source among them; URLs an earlier
+        # source already brought are parsed again just for the cache entry
+        for url in sources:
+            with self.lock:
+                entry = self.pending.pop(url, None)
+            if not entry:
+                continue
+            info, raw = entry
+            again = parse_unique(r for r in raw if r not in results)
+            try:
+                self.cache.save(url, info, raw, [results[r] if r in results else again[r]
+                                                 for r in raw])
+            except Exception as e:
+                print(f"⚠️ Could not cache {url}: {e}")
+        return results
+
+    def parse_sources(self, sources: list[tuple[str, list[str]]]):
+        """
+        Parse [(source url, proxy_urls), ...] in order, yielding
+        (source url, proxy) for every proxy URL parsed for the first time
+        this run. Repeats are counted but not yielded again: they could only
+        produce a proxy already yielded.
+        """
+        results = self.parse_new((raw for _, proxy_urls in sources for raw in proxy_urls),
+                                 [url for url, _ in sources])
+        for url, proxy_urls in sources:
+            for raw in proxy_urls:
+                if raw in results:
+                    parsed = results.pop(raw)
+                    ok = parsed is not None
+                else:
+                    parsed, ok = None, self.seen[ParseMemo.key(raw)]
+                if not ok:
+                    self.failed_count += 1
+                    continue
+                self.parsed_count += 1
+                if parsed:
+                    yield url, dict(parsed)
+
+    def parse_proxies_parallel(self, proxy_urls: list[str]) -> list[dict]:
+        """
+        Parse proxy URLs into dictionaries, reusing cached parses.
+        Output order follows `proxy_urls`; a URL repeated in it is
+        returned once.
+        """
+        with self.lock:
+            sources = list(dict.fromkeys(list(self.preparsed) + list(self.pending)))
+        # The collected list spans every source downloaded so far
+        results = self.parse_new(proxy_urls, sources)
+        parsed_proxies = []
+        for raw in proxy_urls:
+            parsed = results.pop(raw, None)
+            if parsed:
+                proxy = dict(parsed)
+                # Same record shape as the streamed path
+                if raw in self.raw_sources:
+                    proxy["source"] = self.raw_sources[raw]
+                parsed_proxies.append(proxy)
+            elif not self.seen[ParseMemo.key(raw)]:
+                self.failed_count += 1
+        return parsed_proxies
+
+    def each_unique_proxy(self, urls: list[str], emit):
+        """
+        Download, parse and dedupe sources as they finish, calling
+        emit(proxy) once for every proxy not seen in an earlier source.
+        """
+        seen_hashes = set()
+        self.unique_count = 0
+        self.parsed_count = 0
+
+        def on_sources(batch):
+            # One parse call per batch so the process pool sees every new URL
+            for url, proxy in self.parse_sources(batch):
+                proxy_hash = calculate_proxy_hash(proxy)
+                if proxy_hash in seen_hashes:
+                    continue
+                seen_hashes.add(proxy_hash)
+                self.unique_count += 1
+                proxy["source"] = url
+                emit(proxy)
+
+        self.download_all_parallel(urls, on_sources)
+
+    def stream_proxies(self, urls: list[str], out: queue.Queue):
+        """
+        Put each new proxy on the bounded queue `out` (blocking when it is
+        full) as its source finishes. A final None marks the end.
+        """
+        try:
+            self.each_unique_proxy(urls, out.put)
+        finally:
+            out.put(None)
+
+    def write_proxies(self, urls: list[str], temp_dir=TEMP_DIR, fmt: str = PARSED_FORMAT) -> str:
+        """Append each new proxy to the NDJSON interchange file as it is parsed"""
+        path = parsed_path(temp_dir, fmt)
+        with ProxyWriter(path) as writer:
+            self.each_unique_proxy(urls, writer.write)
+        return path
+
+    def save_results(self, proxy_urls: list[str], parsed_proxies: list[dict],
+                     temp_dir=TEMP_DIR) -> dict:
+        """Save parsed proxies and download stats, return the stats"""
+        temp_dir = pathlib.Path(temp_dir)
+        temp_dir.mkdir(exist_ok=True)
+        if PARSED_FORMAT == "json":
+            path = parsed_path(temp_dir, "json")
+            save_json(path, parsed_proxies)
+            remove_stale(path)
+        else:
+            with ProxyWriter(parsed_path(temp_dir)) as writer:
+                for proxy in parsed_proxies:
+                    writer.write(proxy)
+        return self.save_stats(len(proxy_urls), len(parsed_proxies), temp_dir)
+
+    def save_stats(self, total_urls: int, total_parsed: int, temp_dir=TEMP_DIR) -> dict:
+        """Save download stats, return them"""
+        temp_dir = pathlib.Path(temp_dir)
+        temp_dir.mkdir(exist_ok=True)
+        timings = [s["seconds"] for s in self.source_stats if s.get("seconds") is not None]
+        stats = {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "total_urls": total_urls,
+            "total_parsed": total_parsed,  # After deduplication
+            "failed": self.failed_count,
+            "sources": len(self.source_stats),
+            "sources_failed": sum(1 for s in self.source_stats if s.get("error")
+                                  or s.get("status") not in (200, None)),
+            "unique_configs": total_parsed,
+            "slowest_source_seconds": max(timings) if timings else 0,
+            "cache": {
+                "enabled": self.cache is not None,
+                "hits_not_modified": sum(1 for s in self.source_stats
+                                         if s.get("cache") == "not_modified"),
+                "hits_digest": sum(1 for s in self.source_stats if s.get("cache") == "digest"),
+                "misses": sum(1 for s in self.source_stats if s.get("cache") == "miss"),
+            },
+            "parse_memo": dict(self.memo.stats(), enabled=True) if self.memo else {"enabled": False},
+            "source_timing": self.source_stats,
+        }
+        if self.memo:
+            try:
+                self.memo.save()
+            except Exception as e:
+                print(f"⚠️ Could not save parse memo: {e}")
+        save_json(temp_dir / "download_stats.json", stats)
+        return stats
+
+
+def print_parse_summary(downloader: SubscriptionDownloader, parsed_count: int):
+    print(f"✅ Successfully parsed: {parsed_count} proxies")
+    if downloader.failed_count > 0:
+        print(f"⚠️  Failed to parse: {downloader.failed_count} proxies")
+    if downloader.memo:
+        memo = downloader.memo.stats()
+        print(f"🧠 Parse memo: {memo['hit_rate']}% hit rate "
+              f"({memo['hits']} parsed, {memo['rejected_hits']} rejected, {memo['misses']} new)"
+              + (" — parser changed, memo rebuilt" if memo['invalidated'] else ""))
+
+
 def main():
     print("🚀 Starting subscription download...")
-    urls = load_subscriptions()
-
-    all_proxy_urls = []
-    for url in urls:
-        print(f"→ Fetching: {url}")
-        raw = fetch_subscription(url)
-        parsed = parse_subscription_data(raw)
-        print(f"   ↳ Found {len(parsed)} proxy URLs.")
-        all_proxy_urls.extend(parsed)
-
-    print(f"\n✅ Total proxy URLs collected: {len(all_proxy_urls)}")
-
-    # Parse proxy URLs into dictionaries
-    print("🔄 Parsing proxy configurations...")
-    parsed_proxies = []
-    failed_count = 0
-
-    for proxy_url in all_proxy_urls:
-        parsed = parse_proxy_url(proxy_url)
-        if parsed:
-            parsed_proxies.append(parsed)
-        else:
-            failed_count += 1
-
-    print(f"✅ Successfully parsed: {len(parsed_proxies)} proxies")
-    if failed_count > 0:
-        print(f"⚠️  Failed to parse: {failed_count} proxies")
-
-    # Remove duplicates
-    print(f"\n🔍 Checking for duplicate configurations...")
-    parsed_proxies = remove_duplicate_proxies(parsed_proxies)
-
-    # Save parsed proxies
-    parsed_path = TEMP_DIR / "parsed_proxies.json"
-    save_json(parsed_path, parsed_proxies)
-
-    stats = {
-        "timestamp": datetime.utcnow().isoformat() + "Z",
-        "total_urls": len(all_proxy_urls),
-        "total_parsed": len(parsed_proxies),  # After deduplication
-        "failed": failed_count,
-        "sources": len(urls),
-        "unique_configs": len(parsed_proxies),
-    }
-    save_json(TEMP_DIR / "download_stats.json", stats)
-
-    print(f"📦 Saved results to: {parsed_path}")
+    downloader = SubscriptionDownloader()
+    urls = downloader.read_subscription_urls()
+
+    start_time = time.monotonic()
+    if PARSED_FORMAT == "json":
+        all_proxy_urls = downloader.download_all_parallel(urls)
+        elapsed = time.monotonic() - start_time
+
+        print(f"\n✅ Total proxy URLs collected: {len(all_proxy_urls)} in {elapsed:.1f}s")
+
+        # Parse proxy URLs into dictionaries
+        print("🔄 Parsing proxy configurations...")
+        parsed_proxies = downloader.parse_proxies_parallel(all_proxy_urls)
+        print_parse_summary(downloader, len(parsed_proxies))
+
+        # Remove duplicates
+        print(f"\n🔍 Checking for duplicate configurations...")
+        parsed_proxies = remove_duplicate_proxies(parsed_proxies)
+
+        # Save parsed proxies
+        saved_path = parsed_path(TEMP_DIR, "json")
+        stats = downloader.save_results(all_proxy_urls, parsed_proxies, TEMP_DIR)
+    else:
+        # Parse, dedupe and append each source as soon as it is downloaded
+        print("🔄 Parsing proxy configurations as sources arrive...")
+        saved_path = downloader.write_proxies(urls, TEMP_DIR)
+        elapsed = time.monotonic() - start_time
+
+        print(f"\n✅ Total proxy URLs collected: {downloader.total_urls} in {elapsed:.1f}s")
+        print_parse_summary(downloader, downloader.parsed_count)
+        duplicates = downloader.parsed_count - downloader.unique_count
+        if duplicates > 0:
+            print(f"🔄 Removed {duplicates} duplicate configs")
+            print(f"✅ Unique configs: {downloader.unique_count}")
+
+        stats = downloader.save_stats(downloader.total_urls, downloader.unique_count, TEMP_DIR)
+
+    print(f"📦 Saved results to: {saved_path}")
     print(f"🕒 Timestamp: {stats['timestamp']}")
 
     # If there are working configs, generate summary
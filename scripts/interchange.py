@@ -0,0 +1,93 @@
+"""
+Parsed-proxy interchange between the downloader and the tester
+json: the legacy indented array | ndjson: one proxy per line | ndjson.gz: gzipped
+Readers accept every format, the legacy array included.
+"""
+import os
+import gzip
+import json
+from typing import Dict, Iterator, Optional
+
+PARSED_FORMAT = os.environ.get('PARSED_FORMAT', 'ndjson').lower()
+
+FORMAT_FILES = {
+    'ndjson.gz': 'parsed_proxies.ndjson.gz',
+    'ndjson': 'parsed_proxies.ndjson',
+    'json': 'parsed_proxies.json',
+}
+
+
+def parsed_path(temp_dir, fmt: str = PARSED_FORMAT) -> str:
+    return os.path.join(str(temp_dir), FORMAT_FILES.get(fmt, FORMAT_FILES['ndjson']))
+
+
+def find_parsed(temp_dir) -> Optional[str]:
+    """The most recently written parsed-proxy file in any format"""
+    found = [p for p in (parsed_path(temp_dir, fmt) for fmt in FORMAT_FILES) if os.path.exists(p)]
+    return max(found, key=os.path.getmtime) if found else None
+
+
+def remove_stale(path: str):
+    """Delete parsed-proxy files in the other formats next to `path`"""
+    for name in FORMAT_FILES.values():
+        other = os.path.join(os.path.dirname(path), name)
+        if other != path and os.path.exists(other):
+            os.remove(other)
+
+
+def _open(path: str, mode: str, gz: Optional[bool] = None):
+    if path.endswith('.gz') if gz is None else gz:
+        return gzip.open(path, mode + 't', encoding='utf-8', compresslevel=6)
+    return open(path, mode, encoding='utf-8')
+
+
+class ProxyWriter:
+    """
+    Appends proxies to an NDJSON file as they are produced.
+    Writes go to a temp file that replaces the target on close, so a
+    reader never sees half a run; other formats' files are removed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp = path + '.tmp'
+        self.count = 0
+        self.file = None
+
+    def __enter__(self) -> 'ProxyWriter':
+        self.file = _open(self.tmp, 'w', self.path.endswith('.gz'))
+        return self
+
+    def write(self, proxy: Dict):
+        self.file.write(json.dumps(proxy, ensure_ascii=False, separators=(',', ':')))
+        self.file.write('\n')
+        self.count += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        self.file.close()
+        if exc_type:
+            os.remove(self.tmp)
+            return False
+        os.replace(self.tmp, self.path)
+        remove_stale(self.path)
+        return False
+
+
+def iter_proxies(path: str) -> Iterator[Dict]:
+    """
+    Yield proxies from any parsed-proxy file.
+    NDJSON is read line by line; a legacy JSON array has to be loaded whole.
+    """
+    with _open(path, 'r') as f:
+        first = f.read(1)
+        while first and first.isspace():
+            first = f.read(1)
+        if first == '[':
+            yield from json.loads(first + f.read())
+            return
+
+        line = first + f.readline()
+        while line:
+            if line.strip():
+                yield json.loads(line)
+            line = f.readline()
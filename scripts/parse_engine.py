@@ -0,0 +1,144 @@
+"""
+Bulk parsing of proxy share URLs
+Raw strings are deduped before parsing; large inputs are parsed in
+process-pool chunks so every CPU core works on its own slice.
+"""
+import os
+import json
+import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import utils
+from utils import parse_proxy_url
+
+PARSE_WORKERS = int(os.environ.get('PARSE_WORKERS', 0))          # 0: one per CPU
+PARSE_CHUNK = max(1, int(os.environ.get('PARSE_CHUNK', 5000)))
+# Below this many unique URLs a process pool costs more than it saves
+PARSE_PARALLEL_MIN = int(os.environ.get('PARSE_PARALLEL_MIN', 20000))
+PARSE_MEMO_MAX = int(os.environ.get('PARSE_MEMO_MAX', 500000))        # entries kept
+PARSE_MEMO_MAX_AGE = int(os.environ.get('PARSE_MEMO_MAX_AGE', 14 * 86400))  # since last use
+
+
+def _parse_chunk(urls: List[str]) -> List[Optional[Dict]]:
+    return [parse_proxy_url(url) for url in urls]
+
+
+def parse_unique(urls: Iterable[str], workers: int = PARSE_WORKERS) -> Dict[str, Optional[Dict]]:
+    """
+    Parse each distinct URL once.
+    Returns raw URL -> parsed proxy, or None for URLs the parser rejects.
+    """
+    unique = list(dict.fromkeys(urls))
+    workers = workers or os.cpu_count() or 1
+
+    if workers > 1 and len(unique) >= PARSE_PARALLEL_MIN:
+        chunks = [unique[i:i + PARSE_CHUNK] for i in range(0, len(unique), PARSE_CHUNK)]
+        try:
+            results = {}
+            with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+                for chunk, parsed in zip(chunks, executor.map(_parse_chunk, chunks)):
+                    results.update(zip(chunk, parsed))
+            return results
+        except Exception as e:
+            # No usable process pool here (sandbox, frozen build): parse in-process
+            print(f"⚠️ Parallel parse unavailable ({e}), parsing in-process")
+
+    return dict(zip(unique, _parse_chunk(unique)))
+
+
+def parser_version() -> str:
+    """Digest of the parser source: any edit to utils.py invalidates the memo"""
+    try:
+        with open(utils.__file__, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()[:12]
+    except Exception:
+        return 'unknown'
+
+
+class ParseMemo:
+    """
+    Raw share URL -> parse result, persisted between runs.
+    Keyed by a digest of the URL string; a None result marks a URL the
+    parser rejected so it is skipped too. Entries unused for max_age are
+    dropped, and beyond max_entries the least recently used go first.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = PARSE_MEMO_MAX,
+                 max_age: int = PARSE_MEMO_MAX_AGE):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.version = parser_version()
+        self.entries = {}   # digest -> [last used ts, parsed or None]
+        self.hits = 0
+        self.rejected_hits = 0
+        self.misses = 0
+        self.invalidated = False
+        if path:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == self.version:
+                    self.entries = data['entries']
+                else:
+                    self.invalidated = True
+            except Exception:
+                self.entries = {}
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.blake2b(url.encode('utf-8', errors='surrogatepass'),
+                               digest_size=12).hexdigest()
+
+    def lookup(self, urls: Iterable[str]) -> Tuple[Dict[str, Optional[Dict]], List[str]]:
+        """Split urls into (memoized results, URLs still to parse)"""
+        found = {}
+        missing = []
+        now = int(time.time())
+        for url in dict.fromkeys(urls):
+            entry = self.entries.get(self.key(url))
+            if entry is None:
+                missing.append(url)
+                continue
+            entry[0] = now
+            found[url] = entry[1]
+            if entry[1] is None:
+                self.rejected_hits += 1
+            else:
+                self.hits += 1
+        self.misses += len(missing)
+        return found, missing
+
+    def update(self, results: Dict[str, Optional[Dict]]):
+        now = int(time.time())
+        for url, parsed in results.items():
+            self.entries[self.key(url)] = [now, parsed]
+
+    def stats(self) -> Dict:
+        looked_up = self.hits + self.rejected_hits + self.misses
+        return {
+            'parser_version': self.version,
+            'invalidated': self.invalidated,
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'rejected_hits': self.rejected_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.hits + self.rejected_hits) / looked_up * 100, 1) if looked_up else 0,
+        }
+
+    def save(self):
+        if not self.path:
+            return
+        horizon = time.time() - self.max_age
+        live = [(k, e) for k, e in self.entries.items() if e[0] >= horizon]
+        if len(live) > self.max_entries:
+            live.sort(key=lambda item: item[1][0], reverse=True)
+            live = live[:self.max_entries]
+        self.entries = dict(live)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.version, 'entries': self.entries}, f,
+                      ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp, self.path)
@@ -0,0 +1,254 @@
+"""
+Cheap network pre-stages run before any Clash process is spawned
+"""
+import os
+import json
+import time
+import socket
+import asyncio
+import ipaddress
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple
+
+PREFILTER_CONCURRENCY = int(os.environ.get('PREFILTER_CONCURRENCY', 1000))
+PREFILTER_TIMEOUT = float(os.environ.get('PREFILTER_TIMEOUT', 3))
+DNS_CONCURRENCY = int(os.environ.get('DNS_CONCURRENCY', 256))
+DNS_TIMEOUT = float(os.environ.get('DNS_TIMEOUT', 5))
+DNS_CACHE_TTL = int(os.environ.get('DNS_CACHE_TTL', 3600))
+DNS_NEGATIVE_TTL = int(os.environ.get('DNS_NEGATIVE_TTL', 300))
+
+
+def raise_fd_limit(wanted: int) -> int:
+    """Raise the soft open-file limit towards `wanted`, return the usable limit"""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        target = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+        if target > soft:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+            soft = target
+        return soft
+    except Exception:
+        return wanted
+
+
+async def tcp_connect_time(host: str, port: int, timeout: float) -> Optional[float]:
+    """Open and close one TCP connection, return connect time in ms or None"""
+    start = time.perf_counter()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except Exception:
+        return None
+    elapsed = (time.perf_counter() - start) * 1000
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except Exception:
+        pass
+    return elapsed
+
+
+async def _scan(endpoints: List[Tuple[str, int]], concurrency: int,
+                timeout: float) -> Dict[Tuple[str, int], Optional[float]]:
+    """
+    Hostnames are resolved up front on the DNS pool, so the connect
+    timeout only ever covers a TCP handshake to an IP.
+    """
+    hosts = sorted({host for host, _ in endpoints if not is_ip(host)})
+    resolved = await _resolve_all(hosts, DNS_CONCURRENCY, DNS_TIMEOUT) if hosts else {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def probe(endpoint):
+        host, port = endpoint
+        ip = host if is_ip(host) else (resolved.get(host) or [None])[0]
+        if ip is None:
+            return endpoint, None
+        async with semaphore:
+            return endpoint, await tcp_connect_time(ip, port, timeout)
+
+    return dict(await asyncio.gather(*(probe(e) for e in endpoints)))
+
+
+class DNSCache:
+    """Host -> resolved IPs table, persisted between runs with a TTL"""
+
+    def __init__(self, path: Optional[str] = None, ttl: int = DNS_CACHE_TTL,
+                 negative_ttl: int = DNS_NEGATIVE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries = {}
+        if path:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except Exception:
+                self.entries = {}
+
+    def get(self, host: str) -> Optional[List[str]]:
+        """Cached IPs ([] = known not to resolve), or None when unknown/expired"""
+        entry = self.entries.get(host)
+        if not entry:
+            return None
+        ttl = self.ttl if entry['ips'] else self.negative_ttl
+        if time.time() - entry['ts'] > ttl:
+            return None
+        return entry['ips']
+
+    def put(self, host: str, ips: List[str]):
+        self.entries[host] = {'ips': ips, 'ts': int(time.time())}
+
+    def save(self):
+        if not self.path:
+            return
+        horizon = time.time() - max(self.ttl, self.negative_ttl)
+        entries = {h: e for h, e in self.entries.items() if e['ts'] >= horizon}
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, separators=(',', ':'))
+        os.replace(tmp, self.path)
+
+
+def _getaddrinfo(host: str) -> list:
+    try:
+        return socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    except Exception:
+        return []
+
+
+def _ordered_ips(infos: list) -> List[str]:
+    """Unique addresses, IPv4 first"""
+    ips = []
+    for family, _, _, _, sockaddr in sorted(infos, key=lambda i: i[0] != socket.AF_INET):
+        if sockaddr[0] not in ips:
+            ips.append(sockaddr[0])
+    return ips
+
+
+async def _resolve_all(hosts: List[str], concurrency: int,
+                       timeout: float) -> Dict[str, Optional[List[str]]]:
+    """
+    host -> IPs ([] = does not resolve, None = timed out).
+    Lookups run on a pool of exactly `concurrency` threads. A slot is
+    freed when its thread finishes, not when the caller gives up on it,
+    so every lookup starts on submission and its timeout covers only it.
+    """
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='dns')
+    slots = asyncio.Semaphore(concurrency)
+
+    async def resolve(host):
+        await slots.acquire()
+        lookup = loop.run_in_executor(executor, _getaddrinfo, host)
+        lookup.add_done_callback(lambda _: slots.release())
+        try:
+            return host, _ordered_ips(await asyncio.wait_for(asyncio.shield(lookup), timeout))
+        except asyncio.TimeoutError:
+            return host, None
+
+    try:
+        return dict(await asyncio.gather(*(resolve(h) for h in hosts)))
+    finally:
+        executor.shutdown(wait=False)
+
+
+def is_ip(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+
+def dns_prefilter(proxies: List[Dict], cache: Optional[DNSCache] = None,
+                  concurrency: int = DNS_CONCURRENCY,
+                  timeout: float = DNS_TIMEOUT,
+                  timed_out: Optional[set] = None) -> List[Dict]:
+    """
+    Resolve every unique server once, drop proxies whose server does not
+    resolve and set `resolved_ip` on the rest.
+    The id() of each proxy dropped only because its lookup timed out (an
+    unknown, not a failure) is added to `timed_out` when given.
+    """
+    cache = cache or DNSCache()
+    hosts = {str(p.get('server', '')) for p in proxies}
+    lookups = sorted(h for h in hosts if h and not is_ip(h) and cache.get(h) is None)
+
+    print(f"\nDNS pre-stage: {len(hosts)} unique servers, "
+          f"{len(lookups)} to resolve (concurrency {concurrency})")
+    start = time.time()
+    unknown = set()
+    if lookups:
+        for host, ips in asyncio.run(_resolve_all(lookups, concurrency, timeout)).items():
+            if ips is None:  # A timeout is not cached as a negative answer
+                unknown.add(host)
+            else:
+                cache.put(host, ips)
+    cache.save()
+
+    kept = []
+    dropped = {}
+    for proxy in proxies:
+        host = str(proxy.get('server', ''))
+        ips = [host] if is_ip(host) else (cache.get(host) or [])
+        if not ips:
+            ptype = proxy.get('type', 'unknown')
+            dropped[ptype] = dropped.get(ptype, 0) + 1
+            if host in unknown and timed_out is not None:
+                timed_out.add(id(proxy))
+            continue
+        proxy['resolved_ip'] = ips[0]
+        kept.append(proxy)
+
+    print(f"  Resolved: {len(kept)}/{len(proxies)} in {time.time() - start:.1f}s")
+    for ptype, count in sorted(dropped.items()):
+        print(f"  Unresolvable {ptype.upper()}: {count}")
+
+    return kept
+
+
+def tcp_prefilter(proxies: List[Dict], concurrency: int = PREFILTER_CONCURRENCY,
+                  timeout: float = PREFILTER_TIMEOUT) -> List[Dict]:
+    """
+    Drop proxies whose server:port does not accept a TCP connection.
+    Each unique endpoint is connected once; survivors get `connect_ms`.
+    Uses `resolved_ip` from the DNS pre-stage when present, and resolves
+    any other hostname before connecting.
+    """
+    def endpoint(proxy):
+        return str(proxy.get('resolved_ip') or proxy['server']), int(proxy['port'])
+
+    endpoints = set()
+    for proxy in proxies:
+        try:
+            endpoints.add(endpoint(proxy))
+        except (KeyError, ValueError, TypeError):
+            pass
+
+    # Leave headroom for the Clash processes that follow
+    concurrency = max(1, min(concurrency, raise_fd_limit(concurrency + 1024) - 256))
+
+    print(f"\nTCP pre-filter: {len(endpoints)} endpoints "
+          f"(concurrency {concurrency}, timeout {timeout}s)")
+    start = time.time()
+    results = asyncio.run(_scan(sorted(endpoints), concurrency, timeout))
+
+    kept = []
+    dropped = {}
+    for proxy in proxies:
+        try:
+            connect_ms = results.get(endpoint(proxy))
+        except (KeyError, ValueError, TypeError):
+            connect_ms = None
+        if connect_ms is None:
+            ptype = proxy.get('type', 'unknown')
+            dropped[ptype] = dropped.get(ptype, 0) + 1
+            continue
+        proxy['connect_ms'] = round(connect_ms, 2)
+        kept.append(proxy)
+
+    print(f"  Reachable: {len(kept)}/{len(proxies)} in {time.time() - start:.1f}s")
+    for ptype, count in sorted(dropped.items()):
+        print(f"  Eliminated {ptype.upper()}: {count}")
+
+    return kept
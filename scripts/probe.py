@@ -0,0 +1,391 @@
+"""
+Lightweight asyncio probe client for the Clash inbound ports
+Speaks HTTP CONNECT or SOCKS5 to the local port and sends a raw GET,
+timing each phase with perf_counter. One event loop runs every probe.
+"""
+import os
+import ssl
+import time
+import asyncio
+import concurrent.futures
+import threading
+import urllib.parse
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import List, Dict, Optional, Tuple
+
+# connect: HTTP CONNECT tunnel | socks5: SOCKS5 CONNECT (the tester's cores all use mixed ports)
+PROBE_PROTOCOL = os.environ.get('PROBE_PROTOCOL', 'connect').lower()
+CLOSE_TIMEOUT = 1.0   # Seconds a closing tunnel may take before it is abandoned
+ENGINE_MARGIN = 5.0   # Slack on top of a batch's probe budget before the caller gives up
+
+
+@dataclass
+class ProbeResult:
+    ok: bool
+    status: int = 0
+    connect_ms: float = 0.0      # TCP connect to the local Clash port
+    handshake_ms: float = 0.0    # CONNECT / SOCKS5 reply; the core answers before dialing out
+    first_byte_ms: float = 0.0   # Request sent -> first response line, upstream dial included
+    total_ms: float = 0.0
+    error: str = ''
+
+
+def _ms(since: float) -> float:
+    return (time.perf_counter() - since) * 1000
+
+
+async def _socks5_connect(reader, writer, host: str, port: int):
+    writer.write(b'\x05\x01\x00')
+    await writer.drain()
+    if await reader.readexactly(2) != b'\x05\x00':
+        raise ConnectionError('socks5 auth rejected')
+
+    host_b = host.encode('idna')
+    writer.write(b'\x05\x01\x00\x03' + bytes([len(host_b)]) + host_b + port.to_bytes(2, 'big'))
+    await writer.drain()
+    head = await reader.readexactly(4)
+    if head[1] != 0:
+        raise ConnectionError(f'socks5 reply {head[1]}')
+    # Skip the bound address
+    atyp = head[3]
+    if atyp == 1:
+        await reader.readexactly(4 + 2)
+    elif atyp == 4:
+        await reader.readexactly(16 + 2)
+    else:
+        await reader.readexactly((await reader.readexactly(1))[0] + 2)
+
+
+async def _http_connect(reader, writer, host: str, port: int):
+    writer.write(f'CONNECT {host}:{port} HTTP/1.1\r\nHost: {host}:{port}\r\n\r\n'.encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    parts = status_line.split()
+    if len(parts) < 2 or parts[1] != b'200':
+        raise ConnectionError(f'CONNECT {status_line.decode(errors="ignore").strip()}')
+    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+        pass
+
+
+async def open_tunnel(local_port: int, host: str, port: int,
+                      protocol: str = PROBE_PROTOCOL) -> Tuple:
+    """Open a tunnel through Clash, return (reader, writer, connect_ms, handshake_ms)"""
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection('127.0.0.1', local_port)
+    connect_ms = _ms(start)
+
+    start = time.perf_counter()
+    try:
+        if protocol == 'socks5':
+            await _socks5_connect(reader, writer, host, port)
+        else:
+            await _http_connect(reader, writer, host, port)
+    except BaseException:
+        writer.close()
+        raise
+    return reader, writer, connect_ms, _ms(start)
+
+
+async def _close(writer):
+    """
+    Drop the connection without waiting on the peer. A start_tls cancelled
+    mid-handshake leaves wait_closed() pending forever, so it is bounded.
+    """
+    writer.transport.abort()
+    try:
+        await asyncio.wait_for(writer.wait_closed(), CLOSE_TIMEOUT)
+    except BaseException:
+        pass
+
+
+@asynccontextmanager
+async def tunnel(local_port: int, url: str, protocol: str = PROBE_PROTOCOL):
+    """
+    Tunnel to the URL's host through Clash, TLS-wrapped for https.
+    Yields (reader, writer, connect_ms, handshake_ms); always closed on exit.
+    """
+    parts = urllib.parse.urlsplit(url)
+    host = parts.hostname
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    reader, writer, connect_ms, handshake_ms = await open_tunnel(local_port, host, port, protocol)
+    try:
+        if parts.scheme == 'https':
+            ctx = ssl.create_default_context()
+            ctx.check_hostname = False
+            ctx.verify_mode = ssl.CERT_NONE
+            await writer.start_tls(ctx, server_hostname=host)
+        yield reader, writer, connect_ms, handshake_ms
+    finally:
+        await _close(writer)
+
+
+def _request_path(url: str) -> str:
+    parts = urllib.parse.urlsplit(url)
+    return (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+
+
+async def probe_url(local_port: int, url: str, timeout: float,
+                    protocol: str = PROBE_PROTOCOL) -> ProbeResult:
+    """One raw GET through the tunnel; ok on 200/204"""
+    host = urllib.parse.urlsplit(url).hostname
+    path = _request_path(url)
+    start = time.perf_counter()
+
+    async def run() -> ProbeResult:
+        async with tunnel(local_port, url, protocol) as (reader, writer, connect_ms, handshake_ms):
+            sent = time.perf_counter()
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\n'
+                         f'User-Agent: Mozilla/5.0\r\nConnection: close\r\n\r\n'.encode())
+            await writer.drain()
+            status_line = await reader.readline()
+            first_byte_ms = _ms(sent)
+
+        fields = status_line.split()
+        status = int(fields[1]) if len(fields) > 1 and fields[1].isdigit() else 0
+        return ProbeResult(ok=status in (200, 204), status=status, connect_ms=connect_ms,
+                           handshake_ms=handshake_ms, first_byte_ms=first_byte_ms,
+                           total_ms=_ms(start))
+
+    try:
+        return await asyncio.wait_for(run(), timeout)
+    except asyncio.TimeoutError:
+        return ProbeResult(ok=False, total_ms=_ms(start), error='timeout')
+    except Exception as e:
+        return ProbeResult(ok=False, total_ms=_ms(start), error=str(e) or type(e).__name__)
+
+
+async def probe_endpoints(local_port: int, urls: List[str], timeout: float,
+                          race: bool = False, https_url: Optional[str] = None) -> ProbeResult:
+    """
+    Sequential: each endpoint in turn with its own timeout.
+    Race: all endpoints at once under one shared budget, losers cancelled.
+    With https_url, a working proxy must also complete that request.
+    """
+    deadline = time.perf_counter() + timeout
+    result = ProbeResult(ok=False, error='no endpoint answered')
+
+    if race:
+        tasks = [asyncio.ensure_future(probe_url(local_port, url, timeout)) for url in urls]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                candidate = await next_done
+                if candidate.ok:
+                    result = candidate
+                    break
+                result = candidate
+        finally:
+            for task in tasks:
+                task.cancel()
+    else:
+        for url in urls:
+            result = await probe_url(local_port, url, timeout)
+            if result.ok:
+                break
+
+    if result.ok and https_url:
+        remaining = deadline - time.perf_counter() if race else timeout
+        check = await probe_url(local_port, https_url, max(0.1, remaining))
+        if not check.ok and not check.status:
+            return ProbeResult(ok=False, error=f'https: {check.error}')
+    return result
+
+
+async def _read_response(reader) -> int:
+    """Read one full response off a keep-alive connection, return its status"""
+    fields = (await reader.readline()).split()
+    if len(fields) < 2 or not fields[1].isdigit():
+        raise ConnectionError('bad status line')
+    status = int(fields[1])
+
+    length = 0
+    chunked = False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value.strip() or 0)
+        elif name == 'transfer-encoding' and 'chunked' in value.lower():
+            chunked = True
+
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b';')[0].strip() or b'0', 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length:
+        await reader.readexactly(length)
+    return status
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def profile_url(local_port: int, url: str, samples: int, timeout: float,
+                      protocol: str = PROBE_PROTOCOL) -> Optional[Dict]:
+    """
+    Several GETs over one warm keep-alive tunnel.
+    The first request pays for the proxy's TCP/TLS setup and is reported
+    separately; the rest measure steady-state round trips.
+    The core answers CONNECT / SOCKS5 before it dials upstream, so the
+    proxy's setup cost lands in the first request: connect_ms is derived
+    as first_byte_ms minus the warm median.
+    """
+    host = urllib.parse.urlsplit(url).hostname
+    request = (f'GET {_request_path(url)} HTTP/1.1\r\nHost: {host}\r\n'
+               f'User-Agent: Mozilla/5.0\r\nConnection: keep-alive\r\n\r\n').encode()
+
+    async def run() -> Optional[Dict]:
+        timings = []
+        async with tunnel(local_port, url, protocol) as (reader, writer, _, _):
+            for _ in range(samples + 1):  # +1: the cold first request
+                sent = time.perf_counter()
+                writer.write(request)
+                await writer.drain()
+                try:
+                    status = await _read_response(reader)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    break  # Server closed the connection; keep what we have
+                if status not in (200, 204):
+                    break
+                timings.append(_ms(sent))
+
+        if len(timings) < 2:
+            return None
+
+        first_byte_ms, warm = timings[0], timings[1:]
+        jitter = sum(abs(a - b) for a, b in zip(warm, warm[1:])) / max(1, len(warm) - 1)
+        median_ms = _percentile(warm, 0.5)
+        return {
+            'samples': len(warm),
+            'min_ms': round(min(warm), 2),
+            'median_ms': round(median_ms, 2),
+            'p90_ms': round(_percentile(warm, 0.9), 2),
+            'jitter_ms': round(jitter, 2),
+            'connect_ms': round(max(0.0, first_byte_ms - median_ms), 2),
+            'first_byte_ms': round(first_byte_ms, 2),
+        }
+
+    try:
+        return await asyncio.wait_for(run(), timeout)
+    except Exception:
+        return None
+
+
+async def throughput_url(local_port: int, url: str, timeout: float,
+                         protocol: str = PROBE_PROTOCOL) -> Optional[Dict]:
+    """
+    Download `url` through the tunnel and time it.
+    ttfb_ms runs from request sent to status line; mbps covers the body only.
+    """
+    host = urllib.parse.urlsplit(url).hostname
+    path = _request_path(url)
+
+    async def run() -> Optional[Dict]:
+        received = 0
+        async with tunnel(local_port, url, protocol) as (reader, writer, _, _):
+            sent = time.perf_counter()
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\n'
+                         f'User-Agent: Mozilla/5.0\r\nConnection: close\r\n\r\n'.encode())
+            await writer.drain()
+            fields = (await reader.readline()).split()
+            ttfb_ms = _ms(sent)
+            if len(fields) < 2 or fields[1] != b'200':
+                return None
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+
+            body_start = time.perf_counter()
+            while True:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    break
+                received += len(chunk)
+            seconds = time.perf_counter() - body_start
+        if not received:
+            return None
+        return {
+            'mbps': round(received * 8 / max(seconds, 1e-6) / 1e6, 2),
+            'ttfb_ms': round(ttfb_ms, 2),
+            'bytes': received,
+            'seconds': round(seconds, 3),
+        }
+
+    try:
+        return await asyncio.wait_for(run(), timeout)
+    except Exception:
+        return None
+
+
+class ProbeEngine:
+    """Event loop on a background thread that worker threads submit probes to"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def run(self, coro, budget: float, default=None):
+        """
+        Result of `coro`, or `default` if it has not finished within
+        `budget` + ENGINE_MARGIN seconds (it is cancelled then), so a stuck
+        coroutine can never block the calling worker thread for good.
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(budget + ENGINE_MARGIN)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            return default
+
+    @staticmethod
+    def _probe_budget(urls: List[str], timeout: float) -> float:
+        return timeout * (len(urls) + 1)  # Every endpoint in turn, then the HTTPS check
+
+    def probe_many(self, local_ports: List[int], urls: List[str], timeout: float,
+                   race: bool = False, https_url: Optional[str] = None) -> List[ProbeResult]:
+        async def gather():
+            return await asyncio.gather(*(
+                probe_endpoints(port, urls, timeout, race, https_url) for port in local_ports))
+        return self.run(gather(), self._probe_budget(urls, timeout),
+                        [ProbeResult(ok=False, error='engine timeout') for _ in local_ports])
+
+    def profile_many(self, local_ports: List[int], url: str, samples: int,
+                     timeout: float) -> List[Optional[Dict]]:
+        async def gather():
+            return await asyncio.gather(*(
+                profile_url(port, url, samples, timeout) for port in local_ports))
+        return self.run(gather(), timeout, [None] * len(local_ports))
+
+    def throughput_many(self, local_ports: List[int], url: str, timeout: float,
+                        concurrency: int) -> List[Optional[Dict]]:
+        async def gather():
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def one(port):
+                async with semaphore:
+                    return await throughput_url(port, url, timeout)
+            return await asyncio.gather(*(one(port) for port in local_ports))
+        rounds = -(-len(local_ports) // max(1, concurrency))
+        return self.run(gather(), rounds * timeout, [None] * len(local_ports))
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> ProbeEngine:
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = ProbeEngine()
+        return _engine
@@ -0,0 +1,117 @@
+"""
+Diff-aware publishing of the working_configs outputs
+Proxies are written in hash order so each keeps its line between runs,
+and a file is only replaced (atomically) when its content changed.
+"""
+import os
+import glob
+import json
+from typing import Dict, List, Optional, Tuple
+
+from utils import parse_proxy_url, calculate_proxy_hash
+
+# Latency moves smaller than this (ms) keep the previously published value
+OUTPUT_LATENCY_TOLERANCE = float(os.environ.get('OUTPUT_LATENCY_TOLERANCE', 50))
+
+# Per-run measurements left out of the published proxy records
+MEASURED_FIELDS = ('latency_profile', 'throughput', 'connect_ms', 'resolved_ip')
+# Metadata that changes every run; alone it does not rewrite metadata.json
+RUN_METADATA = ('delta', 'clash_startup', 'tiers', 'latency_profile_stats',
+                'throughput_stats', 'test_date', 'timestamp')
+
+
+def _read_lines(path: str) -> List[str]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip()]
+    except OSError:
+        return []
+
+
+def load_previous(output_dir: str) -> Dict[str, Optional[float]]:
+    """
+    hash -> published latency (None if unknown) from the last outputs.
+    Read from sorted_by_latency.txt, or the by-protocol files without it.
+    """
+    previous = {}
+    lines = _read_lines(os.path.join(output_dir, 'sorted_by_latency.txt'))
+    if not lines:
+        for path in sorted(glob.glob(os.path.join(output_dir, 'by_protocol', '*.txt'))):
+            lines.extend(_read_lines(path))
+
+    for line in lines:
+        url, _, note = line.partition(' # ')
+        proxy = parse_proxy_url(url)
+        if not proxy:
+            continue
+        try:
+            latency = float(note[:-2]) if note.endswith('ms') else None
+        except ValueError:
+            latency = None
+        previous[calculate_proxy_hash(proxy)] = latency
+    return previous
+
+
+def diff_previous(previous: Dict[str, Optional[float]], hashes: List[str],
+                  latencies: List[float]) -> Tuple[List[float], Dict]:
+    """
+    Latencies to publish and the delta against the previous outputs.
+    A proxy whose latency moved less than the tolerance keeps its old value.
+    """
+    published = []
+    added = changed = 0
+    for h, latency in zip(hashes, latencies):
+        latency = round(latency)  # As printed, so ties sort the same next run
+        if h not in previous:
+            added += 1
+        elif previous[h] is not None and abs(latency - previous[h]) < OUTPUT_LATENCY_TOLERANCE:
+            latency = previous[h]
+        elif previous[h] is not None:
+            changed += 1
+        published.append(latency)
+
+    current = set(hashes)
+    return published, {
+        'previous': len(previous),
+        'current': len(current),
+        'added': added,
+        'removed': sum(1 for h in previous if h not in current),
+        'latency_changed': changed,
+        'latency_tolerance_ms': OUTPUT_LATENCY_TOLERANCE,
+    }
+
+
+def published_record(proxy: Dict, latency: float) -> Dict:
+    """Proxy as written to working_proxies.json: the published latency, no per-run fields"""
+    record = {k: v for k, v in proxy.items() if k not in MEASURED_FIELDS}
+    record['latency'] = round(latency)  # Whole ms, as in sorted_by_latency.txt
+    return record
+
+
+def write_metadata_if_changed(path: str, metadata: Dict) -> bool:
+    """Replace metadata.json only when something besides RUN_METADATA changed"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            old = json.load(f)
+        if all(old.get(k) == v for k, v in metadata.items() if k not in RUN_METADATA) and \
+                all(k in metadata for k in old):
+            return False
+    except (OSError, ValueError):
+        pass
+    return write_if_changed(path, json.dumps(metadata, indent=2))
+
+
+def write_if_changed(path: str, text: str) -> bool:
+    """Atomically replace `path` with `text` unless it already holds it"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            if f.read() == text:
+                return False
+    except OSError:
+        pass
+
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp, path)
+    return True
@@ -0,0 +1,188 @@
+"""
+SQLite store of every proxy seen and every test attempt made on it
+Writes go through one background thread in batched transactions, so
+probe threads only ever put a tuple on a queue; hashing and JSON
+encoding happen on the writer thread.
+"""
+import os
+import json
+import time
+import queue
+import sqlite3
+import threading
+from contextlib import closing
+from typing import Dict, List, Optional
+
+from utils import calculate_proxy_hash, json_default
+
+DB_BATCH = int(os.environ.get('DB_BATCH', 500))
+DB_FLUSH_INTERVAL = float(os.environ.get('DB_FLUSH_INTERVAL', 1.0))
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS proxies (
+    hash        TEXT PRIMARY KEY,
+    protocol    TEXT,
+    source      TEXT,
+    server      TEXT,
+    port        INTEGER,
+    data        TEXT,
+    first_seen  REAL,
+    last_seen   REAL
+);
+CREATE INDEX IF NOT EXISTS idx_proxies_protocol ON proxies(protocol);
+CREATE INDEX IF NOT EXISTS idx_proxies_source ON proxies(source);
+
+CREATE TABLE IF NOT EXISTS attempts (
+    id       INTEGER PRIMARY KEY,
+    hash     TEXT NOT NULL,
+    run_id   TEXT NOT NULL,
+    ts       REAL NOT NULL,
+    ok       INTEGER NOT NULL,
+    latency  REAL,
+    stage    TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_attempts_hash ON attempts(hash, ts);
+CREATE INDEX IF NOT EXISTS idx_attempts_run ON attempts(run_id, hash);
+
+CREATE TABLE IF NOT EXISTS runs (
+    run_id    TEXT PRIMARY KEY,
+    started   REAL,
+    finished  REAL,
+    tested    INTEGER,
+    working   INTEGER
+);
+'''
+
+UPSERT_PROXY = '''
+INSERT INTO proxies (hash, protocol, source, server, port, data, first_seen, last_seen)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(hash) DO UPDATE SET
+    protocol = excluded.protocol,
+    source = COALESCE(excluded.source, proxies.source),
+    server = excluded.server,
+    port = excluded.port,
+    data = excluded.data,
+    last_seen = excluded.last_seen
+'''
+
+INSERT_ATTEMPT = 'INSERT INTO attempts (hash, run_id, ts, ok, latency, stage) VALUES (?, ?, ?, ?, ?, ?)'
+
+
+class ResultsDB:
+    """
+    Attempt history keyed on calculate_proxy_hash.
+    record() and snapshot() are safe from any thread and never wait on
+    SQLite; close() flushes everything before returning.
+    """
+
+    def __init__(self, path: str, run_id: Optional[str] = None):
+        self.path = path
+        self.run_id = run_id or time.strftime('%Y%m%dT%H%M%S')
+        self.started = time.time()
+        self.queue = queue.Queue()
+        self.written = 0
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+        self.writer = threading.Thread(target=self._writer_loop, daemon=True)
+        self.writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    @staticmethod
+    def _proxy_row(proxy: Dict, now: float) -> tuple:
+        return (calculate_proxy_hash(proxy), proxy.get('type'), proxy.get('source'),
+                str(proxy.get('server')), proxy.get('port'),
+                json.dumps(proxy, ensure_ascii=False, separators=(',', ':'), default=json_default),
+                now, now)
+
+    def record(self, proxy: Dict, ok: bool, latency: float = 0, stage: str = 'probe'):
+        """Queue one attempt (and the proxy's current state)"""
+        self.queue.put((dict(proxy), time.time(), (int(ok), round(latency, 2) if ok else None, stage)))
+
+    def snapshot(self, proxies: List[Dict]):
+        """Refresh stored proxy data, e.g. after profiling added fields"""
+        now = time.time()
+        for proxy in proxies:
+            self.queue.put((dict(proxy), now, None))
+
+    def _rows(self, item: tuple) -> tuple:
+        proxy, now, attempt = item
+        row = self._proxy_row(proxy, now)
+        if attempt:
+            attempt = (row[0], self.run_id, now) + attempt
+        return row, attempt
+
+    def _writer_loop(self):
+        conn = self._connect()
+        try:
+            done = False
+            while not done:
+                batch = []
+                deadline = time.monotonic() + DB_FLUSH_INTERVAL
+                while len(batch) < DB_BATCH:
+                    try:
+                        item = self.queue.get(timeout=max(0.01, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        done = True
+                        break
+                    batch.append(self._rows(item))
+                if batch:
+                    with conn:  # One transaction per batch
+                        conn.executemany(UPSERT_PROXY, [p for p, _ in batch])
+                        conn.executemany(INSERT_ATTEMPT, [a for _, a in batch if a])
+                    self.written += sum(1 for _, a in batch if a)
+        finally:
+            conn.close()
+
+    def close(self, tested: int = 0, working: int = 0):
+        """Flush pending writes; a run that recorded attempts is logged in `runs`"""
+        self.queue.put(None)
+        self.writer.join()
+        if not self.written:
+            return
+        with closing(self._connect()) as conn, conn:
+            conn.execute('INSERT OR REPLACE INTO runs (run_id, started, finished, tested, working) '
+                         'VALUES (?, ?, ?, ?, ?)',
+                         (self.run_id, self.started, time.time(), tested, working))
+
+    def latest_run(self) -> Optional[str]:
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT run_id FROM runs WHERE finished IS NOT NULL '
+                               'ORDER BY started DESC LIMIT 1').fetchone()
+        return row[0] if row else None
+
+    def working(self, run_id: Optional[str] = None) -> List[Dict]:
+        """
+        Proxies whose last attempt in the run succeeded, with that
+        attempt's latency, in the order those attempts were recorded.
+        """
+        run_id = run_id or self.latest_run() or self.run_id
+        with closing(self._connect()) as conn:
+            rows = conn.execute('''
+                SELECT p.data, a.latency
+                FROM attempts a
+                JOIN (SELECT hash, MAX(id) AS id FROM attempts
+                      WHERE run_id = ? GROUP BY hash) last ON last.id = a.id
+                JOIN proxies p ON p.hash = a.hash
+                WHERE a.ok = 1
+                ORDER BY a.id
+            ''', (run_id,)).fetchall()
+        proxies = []
+        for data, latency in rows:
+            proxy = json.loads(data)
+            proxy['latency'] = latency
+            proxies.append(proxy)
+        return proxies
+
+    def history(self, proxy_hash: str, limit: int = 50) -> List[Dict]:
+        with closing(self._connect()) as conn:
+            rows = conn.execute('SELECT run_id, ts, ok, latency, stage FROM attempts '
+                                'WHERE hash = ? ORDER BY ts DESC LIMIT ?',
+                                (proxy_hash, limit)).fetchall()
+        return [dict(zip(('run_id', 'ts', 'ok', 'latency', 'stage'), r)) for r in rows]
@@ -11,77 +11,472 @@ import socket
 import subprocess
 import requests
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import queue
+from collections import deque
+from contextlib import contextmanager
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+from typing import Iterable, List, Dict, Optional, Tuple, Union
 import re
+import glob
 import hashlib
 import warnings
 
 warnings.filterwarnings('ignore')
 requests.packages.urllib3.disable_warnings()
 
-from utils import proxy_to_clash_format, calculate_proxy_hash
+from utils import proxy_to_clash_format, calculate_proxy_hash, share_url, ProxyRecord, json_default
+from prefilter import tcp_prefilter, dns_prefilter, DNSCache
+from probe import get_engine
+from interchange import find_parsed, iter_proxies
+from publish import (load_previous, diff_previous, write_if_changed, published_record,
+                     write_metadata_if_changed)
+from results_db import ResultsDB
+from concurrency import ConcurrencyController, ADAPTIVE, ADAPTIVE_MIN, ADAPTIVE_MAX
+
+# spawn: one Clash per proxy | batch: CLASH_BATCH proxies per Clash via listeners
+# api: CLASH_BATCH proxies per Clash, delays measured by the core's controller
+# pool: TEST_WORKERS long-lived Clash processes, proxies hot-swapped by config reload
+TEST_MODE = os.environ.get('TEST_MODE', 'spawn').lower()
+CLASH_BATCH = max(1, int(os.environ.get('CLASH_BATCH', 50)))
+API_TEST_URL = os.environ.get('API_TEST_URL', 'http://www.gstatic.com/generate_204')
+STREAM_QUEUE = max(1, int(os.environ.get('STREAM_QUEUE', 2000)))
+CLASH_START_TIMEOUT = float(os.environ.get('CLASH_START_TIMEOUT', 5))
+# sequential: try endpoints one by one | race: all at once under one per-proxy budget
+PROBE_MODE = os.environ.get('PROBE_MODE', 'sequential').lower()
+# skip: HTTP 204 is enough | require: an HTTPS request must also get through
+PROBE_HTTPS = os.environ.get('PROBE_HTTPS', 'skip').lower()
+# requests: urllib3 per probe thread | raw: asyncio CONNECT/SOCKS5 client on one event loop
+# Race mode always runs on raw, the only engine that can cancel the losing requests
+PROBE_ENGINE = 'raw' if PROBE_MODE == 'race' else os.environ.get('PROBE_ENGINE', 'requests').lower()
+# Stay below the Linux ephemeral range (32768+) used by outgoing connections
+PORT_MIN = int(os.environ.get('PORT_MIN', 20000))
+PORT_MAX = int(os.environ.get('PORT_MAX', 32000))
+# --profile: keep-alive samples per working proxy, plain-HTTP URL, per-proxy budget
+PROFILE_SAMPLES = max(2, int(os.environ.get('PROFILE_SAMPLES', 5)))
+PROFILE_URL = os.environ.get('PROFILE_URL', 'http://www.gstatic.com/generate_204')
+PROFILE_TIMEOUT = float(os.environ.get('PROFILE_TIMEOUT', 15))
+PROFILE_WORKERS = max(1, int(os.environ.get('PROFILE_WORKERS', 4)))
+# --throughput: payload download through the top-K proxies, a few at a time
+THROUGHPUT_URL = os.environ.get('THROUGHPUT_URL', 'https://speed.cloudflare.com/__down?bytes=5000000')
+THROUGHPUT_TOP_K = max(1, int(os.environ.get('THROUGHPUT_TOP_K', 20)))
+THROUGHPUT_CONCURRENCY = max(1, int(os.environ.get('THROUGHPUT_CONCURRENCY', 4)))
+THROUGHPUT_TIMEOUT = float(os.environ.get('THROUGHPUT_TIMEOUT', 30))
+
+# --tiered: a cheap one-endpoint screen over everything, then deep checks on survivors
+SCREEN_TIMEOUT = float(os.environ.get('SCREEN_TIMEOUT', 4))
+SCREEN_WORKERS = int(os.environ.get('SCREEN_WORKERS', 200))
+VERIFY_TIMEOUT = float(os.environ.get('VERIFY_TIMEOUT', 0))  # 0: per-protocol timeouts
+VERIFY_WORKERS = int(os.environ.get('VERIFY_WORKERS', 50))
+VERIFY_SAMPLES = max(1, int(os.environ.get('VERIFY_SAMPLES', 3)))
+VERIFY_HTTPS = os.environ.get('VERIFY_HTTPS', 'require').lower()
+
+# Incremental mode: how long a cached outcome stays trusted (seconds).
+# A pass outlives the daily scheduled run, so yesterday's working proxies are not retested.
+RESULT_TTL_OK = int(os.environ.get('RESULT_TTL_OK', 30 * 3600))
+RESULT_TTL_FAIL = int(os.environ.get('RESULT_TTL_FAIL', 36 * 3600))
+
+# Write buffer per output file (bytes)
+OUTPUT_BUFFER = int(os.environ.get('OUTPUT_BUFFER', 1 << 20))
+
+# Protocol-specific timeouts
+PROTOCOL_TIMEOUTS = {
+    'ss': 8,        # SS is usually fast
+    'vmess': 10,    # VMess needs more time
+    'vless': 12,    # VLESS needs most time
+    'trojan': 10,   # Trojan moderate
+    'ssr': 8
+}
 
 
 class FastPortManager:
-    def __init__(self):
-        self.current_port = 20000
-        self.max_port = 28000
+    """
+    Free-pool port allocator shared by every test in the run.
+    Ports are bind-probed before being handed out and go back to the
+    end of the pool on release, so a long run never runs dry.
+    """
+    
+    def __init__(self, min_port: int = PORT_MIN, max_port: int = PORT_MAX):
+        self.free = deque(range(min_port, max_port))
+        self.in_use = set()
         self.lock = threading.Lock()
     
-    def acquire(self) -> Optional[int]:
+    @staticmethod
+    def bindable(port: int) -> bool:
+        # SO_REUSEADDR like the Go listener, so TIME_WAIT leftovers still count as free
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            try:
+                sock.bind(('127.0.0.1', port))
+                return True
+            except OSError:
+                return False
+    
+    def acquire_many(self, count: int) -> Optional[List[int]]:
+        """Hand out `count` free, bindable ports (not necessarily consecutive)"""
+        ports = []
         with self.lock:
-            if self.current_port >= self.max_port:
+            for _ in range(len(self.free)):
+                if len(ports) == count:
+                    break
+                port = self.free.popleft()
+                if self.bindable(port):
+                    ports.append(port)
+                else:
+                    self.free.append(port)  # Busy elsewhere, retry it later
+            
+            if len(ports) < count:
+                self.free.extendleft(reversed(ports))
                 return None
-            port = self.current_port
-            self.current_port += 1
-            return port
+            
+            self.in_use.update(ports)
+            return ports
+    
+    def acquire(self) -> Optional[int]:
+        ports = self.acquire_many(1)
+        return ports[0] if ports else None
+    
+    def acquire_triple(self) -> Optional[Tuple[int, int, int]]:
+        """(mixed/http, socks, controller) for one Clash process"""
+        ports = self.acquire_many(3)
+        return tuple(ports) if ports else None
     
-    def release(self, port: int):
-        pass  # No need to track, just increment
+    def release(self, *ports: int):
+        with self.lock:
+            for port in ports:
+                if port in self.in_use:
+                    self.in_use.remove(port)
+                    self.free.append(port)
 
 
-def ultra_fast_test(proxy_port: int, timeout: int = 10) -> Tuple[bool, float]:
+PORT_MANAGER = FastPortManager()
+
+
+# Where each type keeps its TLS name; only these dial a pre-resolved IP
+TLS_NAME_FIELDS = {'vmess': 'servername', 'vless': 'servername', 'trojan': 'sni',
+                   'hysteria': 'sni', 'hysteria2': 'sni', 'tuic': 'sni'}
+
+
+def clash_proxy(proxy: Dict) -> Dict:
+    """
+    Clash entry for a proxy under test.
+    With a `resolved_ip` from the DNS pre-stage the core dials that IP, so
+    probes do not pay for DNS; the TLS name and the ws/h2 Host stay on
+    the original hostname. SS/SSR plugins may derive a host from the
+    server, so those keep dialing the name.
+    """
+    config = proxy_to_clash_format(proxy)
+    ip = proxy.get('resolved_ip')
+    name_field = TLS_NAME_FIELDS.get(config.get('type'))
+    host = config.get('server')
+    if not ip or not name_field or ip == host:
+        return config
+    
+    config['server'] = ip
+    config.setdefault(name_field, host)
+    if isinstance(config.get('ws-opts'), dict):
+        ws = config['ws-opts'] = dict(config['ws-opts'])
+        ws['headers'] = dict(ws.get('headers') or {})
+        ws['headers'].setdefault('Host', host)
+    if isinstance(config.get('h2-opts'), dict):
+        config['h2-opts'] = dict(config['h2-opts'])
+        config['h2-opts'].setdefault('host', [host])
+    return config
+
+
+def stop_clash(proc: Optional[subprocess.Popen]):
+    """Kill a core and wait for it so its ports are really closed"""
+    if not proc:
+        return
+    try:
+        proc.kill()
+        proc.wait(timeout=2)
+    except:
+        pass
+
+
+class ResultCache:
+    """Last test outcome per proxy hash, with separate TTLs for pass and fail"""
+    
+    def __init__(self, path: str, ttl_ok: int = RESULT_TTL_OK, ttl_fail: int = RESULT_TTL_FAIL):
+        self.path = path
+        self.ttl_ok = ttl_ok
+        self.ttl_fail = ttl_fail
+        self.entries = {}
+        self.lock = threading.Lock()
+    
+    def load(self, seed_dir: Optional[str] = None) -> int:
+        """Load the cache, seeding from the last run's outputs if there is none"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except:
+            self.entries = {}
+        
+        if not self.entries and seed_dir:
+            try:
+                with open(os.path.join(seed_dir, 'metadata.json'), 'r', encoding='utf-8') as f:
+                    ts = int(json.load(f).get('timestamp', 0))
+                with open(os.path.join(seed_dir, 'working_proxies.json'), 'r', encoding='utf-8') as f:
+                    for proxy in json.load(f):
+                        self.entries[calculate_proxy_hash(proxy)] = {
+                            'ok': True, 'latency': proxy.get('latency', 0), 'ts': ts
+                        }
+            except:
+                pass
+        
+        return len(self.entries)
+    
+    def lookup(self, proxy: Dict) -> Optional[Dict]:
+        """Return the cached entry if it has not expired"""
+        entry = self.entries.get(calculate_proxy_hash(proxy))
+        if not entry:
+            return None
+        ttl = self.ttl_ok if entry.get('ok') else self.ttl_fail
+        if time.time() - entry.get('ts', 0) > ttl:
+            return None
+        return entry
+    
+    def record(self, proxy: Dict, success: bool, latency: float):
+        with self.lock:
+            self.entries[calculate_proxy_hash(proxy)] = {
+                'ok': success, 'latency': round(latency, 2), 'ts': int(time.time())
+            }
+    
+    def save(self):
+        # Drop entries no TTL can revive
+        horizon = time.time() - max(self.ttl_ok, self.ttl_fail)
+        entries = {h: e for h, e in self.entries.items() if e.get('ts', 0) >= horizon}
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, separators=(',', ':'))
+        os.replace(tmp, self.path)
+
+
+def split_cached(proxies: List[Dict], cache: ResultCache) -> Tuple[List[Dict], List[Dict], int]:
+    """
+    Split proxies into (to_test, cached_working, cached_failed_count).
+    Cached working proxies get their cached latency back.
+    """
+    to_test = []
+    cached_working = []
+    cached_failed = 0
+    
+    for proxy in proxies:
+        entry = cache.lookup(proxy)
+        if entry is None:
+            to_test.append(proxy)
+        elif entry.get('ok'):
+            proxy['latency'] = entry.get('latency', 0)
+            cached_working.append(proxy)
+        else:
+            cached_failed += 1
+    
+    return to_test, cached_working, cached_failed
+
+
+PROBE_URLS = [
+    'http://www.gstatic.com/generate_204',
+    'http://cp.cloudflare.com',
+    'http://connectivitycheck.gstatic.com/generate_204'
+]
+PROBE_HTTPS_URL = 'https://1.1.1.1'
+
+
+@dataclass
+class TestTier:
+    """How hard one pass of the test pushes each proxy"""
+    name: str
+    urls: List[str]
+    workers: int
+    timeout: float = 0          # 0: per-protocol PROTOCOL_TIMEOUTS
+    https: bool = False
+    samples: int = 1            # Latency = median of this many successful probes
+    final: bool = True          # Only a final tier's passes are trusted by the result cache
+    
+    def timeout_for(self, ptype: str) -> float:
+        return self.timeout or PROTOCOL_TIMEOUTS.get(ptype, 10)
+
+
+def default_tier() -> TestTier:
+    """The single-pass test, as configured by PROBE_* and TEST_WORKERS"""
+    return TestTier('full', PROBE_URLS, min(int(os.environ.get('TEST_WORKERS', 150)), 200),
+                    https=PROBE_HTTPS == 'require')
+
+
+def screen_tier() -> TestTier:
+    return TestTier('screen', PROBE_URLS[:1], SCREEN_WORKERS, SCREEN_TIMEOUT, final=False)
+
+
+def verify_tier() -> TestTier:
+    return TestTier('verify', PROBE_URLS, VERIFY_WORKERS, VERIFY_TIMEOUT,
+                    https=VERIFY_HTTPS == 'require', samples=VERIFY_SAMPLES)
+
+
+def median(values: List[float]) -> float:
+    return sorted(values)[len(values)//2]
+
+
+def https_check(proxies: Dict, timeout: float) -> bool:
+    """Any HTTPS response through the proxy counts as a pass"""
+    try:
+        requests.get(PROBE_HTTPS_URL, proxies=proxies, timeout=timeout, verify=False)
+        return True
+    except:
+        return False
+
+
+def raw_probe(ports: List[int], timeout: float,
+              tier: Optional[TestTier] = None) -> List[Tuple[bool, float, str]]:
+    """
+    Probe Clash ports on the shared asyncio engine.
+    Each result is (ok, latency, reason); reason is '' on success, else
+    'https' when only the HTTPS check failed, otherwise 'probe'.
+    """
+    tier = tier or default_tier()
+    engine = get_engine()
+    https_url = PROBE_HTTPS_URL if tier.https else None
+    results = engine.probe_many(ports, tier.urls, timeout, PROBE_MODE == 'race', https_url)
+    samples = [[r.total_ms] if r.ok else [] for r in results]
+    
+    passed = [i for i, r in enumerate(results) if r.ok]
+    for _ in range(tier.samples - 1):
+        if not passed:
+            break
+        extra = engine.probe_many([ports[i] for i in passed], tier.urls[:1], timeout)
+        for i, r in zip(passed, extra):
+            if r.ok:
+                samples[i].append(r.total_ms)
+    
+    return [(True, median(s), '') if s else
+            (False, 0, 'https' if r.error.startswith('https:') else 'probe')
+            for r, s in zip(results, samples)]
+
+
+def sample_latency(proxies: Dict, url: str, count: int, timeout: float) -> List[float]:
+    """Extra latency samples on one endpoint; failed samples are dropped"""
+    latencies = []
+    session = requests.Session()
+    try:
+        for _ in range(count):
+            try:
+                start = time.time()
+                resp = session.get(url, proxies=proxies, timeout=timeout, verify=False)
+                if resp.status_code in [200, 204]:
+                    latencies.append((time.time() - start) * 1000)
+            except:
+                pass
+    finally:
+        session.close()
+    return latencies
+
+
+def ultra_fast_test(proxy_port: int, timeout: int = 10,
+                    tier: Optional[TestTier] = None) -> Tuple[bool, float, str]:
     """
     Ultra-fast test: Just verify basic connectivity
     No fancy validation - if it connects, it works!
+    Returns (ok, latency, reason) like raw_probe.
     """
     proxies = {
         'http': f'http://127.0.0.1:{proxy_port}',
         'https': f'http://127.0.0.1:{proxy_port}'
     }
     
-    # Try 3 different endpoints
-    test_urls = [
-        'http://www.gstatic.com/generate_204',
-        'http://cp.cloudflare.com',
-        'http://connectivitycheck.gstatic.com/generate_204'
-    ]
+    tier = tier or default_tier()
+    
+    if PROBE_ENGINE == 'raw':
+        return raw_probe([proxy_port], timeout, tier)[0]
     
-    for url in test_urls:
+    latency, reason = 0, 'probe'
+    # Try each endpoint in turn
+    for url in tier.urls:
         try:
             start = time.time()
             resp = requests.get(url, proxies=proxies, timeout=timeout, verify=False)
-            latency = (time.time() - start) * 1000
             
             if resp.status_code in [200, 204]:
-                # Success! Try one HTTPS to confirm
-                try:
-                    requests.get('https://1.1.1.1', proxies=proxies, timeout=timeout, verify=False)
-                    return True, latency
-                except:
-                    return True, latency  # HTTP worked, accept it
+                latency = (time.time() - start) * 1000
+                reason = '' if not tier.https or https_check(proxies, timeout) else 'https'
+                break
         except:
             continue
     
-    return False, 0
+    if reason:
+        return False, 0, reason
+    if tier.samples > 1:
+        latency = median([latency] + sample_latency(proxies, tier.urls[0],
+                                                    tier.samples - 1, timeout))
+    return True, latency, ''
+
+
+def port_accepts(port: int, timeout: float = 0.05) -> bool:
+    """True once something is listening on 127.0.0.1:port"""
+    try:
+        with socket.create_connection(('127.0.0.1', port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+class StartupStats:
+    """Measured Clash startup latencies (spawn -> ports accepting)"""
+    
+    def __init__(self):
+        self.samples = []
+        self.failures = 0
+        self.lock = threading.Lock()
+    
+    def record(self, ms: Optional[float]):
+        with self.lock:
+            if ms is None:
+                self.failures += 1
+            else:
+                self.samples.append(ms)
+    
+    def summary(self) -> Dict:
+        with self.lock:
+            samples = sorted(self.samples)
+            failures = self.failures
+        if not samples:
+            return {'count': 0, 'failures': failures}
+        pick = lambda q: round(samples[min(len(samples) - 1, int(len(samples) * q))], 1)
+        return {
+            'count': len(samples),
+            'failures': failures,
+            'min_ms': round(samples[0], 1),
+            'median_ms': pick(0.5),
+            'p90_ms': pick(0.9),
+            'max_ms': round(samples[-1], 1)
+        }
+    
+    def report(self):
+        s = self.summary()
+        if s['count']:
+            print(f"Clash startup: {s['count']} starts, {s['failures']} failed | "
+                  f"min {s['min_ms']}ms, median {s['median_ms']}ms, "
+                  f"p90 {s['p90_ms']}ms, max {s['max_ms']}ms")
 
 
-def quick_clash_start(config_path: str, clash_bin: str, proxy_port: int,
+STARTUP_STATS = StartupStats()
+RESULTS_DB: Optional[ResultsDB] = None  # Set by --db / --from-db
+
+
+def quick_clash_start(config_path: str, clash_bin: str, proxy_port: Union[int, List[int]],
                      control_port: int) -> Optional[subprocess.Popen]:
-    """Quick Clash startup"""
+    """
+    Quick Clash startup.
+    Ready as soon as the inbound port(s) and controller port accept connections,
+    polled with a short backoff; gives up early if the process exits.
+    The measured startup time is kept on proc.startup_ms and in STARTUP_STATS.
+    A core that does not come up is killed and reaped before returning, so
+    its ports are free again when the caller releases them.
+    """
+    proc = None
     try:
+        started = time.perf_counter()
         proc = subprocess.Popen(
             [clash_bin, '-f', config_path],
             stdout=subprocess.DEVNULL,
@@ -89,51 +484,75 @@ def quick_clash_start(config_path: str, clash_bin: str, proxy_port: int,
             creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
         )
         
-        time.sleep(1.2)
+        deadline = started + CLASH_START_TIMEOUT
+        inbound = proxy_port if isinstance(proxy_port, list) else [proxy_port]
+        pending = list(dict.fromkeys(inbound + [control_port]))
+        delay = 0.01
         
-        if proc.poll() is not None:
-            return None
-        
-        # Quick check
-        for _ in range(8):
-            try:
-                resp = requests.get(f'http://127.0.0.1:{control_port}/version', timeout=0.5)
-                if resp.status_code == 200:
-                    time.sleep(0.2)
-                    return proc
-            except:
-                pass
-            time.sleep(0.3)
+        while time.perf_counter() < deadline:
+            if proc.poll() is not None:
+                break  # Died (bad config, port clash): no point waiting
+            
+            pending = [port for port in pending if not port_accepts(port)]
+            if not pending:
+                proc.startup_ms = (time.perf_counter() - started) * 1000
+                STARTUP_STATS.record(proc.startup_ms)
+                return proc
+            
+            time.sleep(delay)
+            delay = min(delay * 1.5, 0.1)
         
-        proc.kill()
+        STARTUP_STATS.record(None)
+        stop_clash(proc)
         return None
     except:
+        stop_clash(proc)
         return None
 
 
+@contextmanager
+def clash_core(config: Dict, clash_bin: str, temp_dir: str, prefix: str,
+               proxy_port: Union[int, List[int]], control_port: int):
+    """
+    Write `config` to a uniquely named file in temp_dir and start Clash on it.
+    Yields the process, or None if it did not come up; on exit the core is
+    stopped and the file removed. Releasing the ports is up to the caller.
+    """
+    uid = hashlib.md5(f"{time.time()}{control_port}".encode()).hexdigest()[:4]
+    cfg = os.path.join(temp_dir, f"{prefix}{uid}.yaml")
+    proc = None
+    try:
+        with open(cfg, 'w', encoding='utf-8') as f:
+            yaml.dump(config, f)
+        proc = quick_clash_start(cfg, clash_bin, proxy_port, control_port)
+        yield proc
+    finally:
+        stop_clash(proc)
+        try:
+            os.remove(cfg)
+        except OSError:
+            pass
+
+
 def test_proxy_ultra(proxy: Dict, clash_bin: str, temp_dir: str,
-                    port_mgr: FastPortManager, timeout: int) -> Tuple[bool, float]:
-    """Ultra-fast proxy test"""
-    port = port_mgr.acquire()
-    if not port:
-        return False, 0
+                    port_mgr: FastPortManager, timeout: int,
+                    tier: Optional[TestTier] = None) -> Tuple[bool, float, str]:
+    """Ultra-fast proxy test; a core that never came up fails with reason 'start'"""
+    ports = port_mgr.acquire_triple()
+    if not ports:
+        return False, 0, 'start'
     
-    ctrl_port = port + 5000
-    proc = None
+    port, socks_port, ctrl_port = ports
     
     try:
-        # Minimal config name
-        uid = hashlib.md5(f"{time.time()}{port}".encode()).hexdigest()[:4]
-        cfg = os.path.join(temp_dir, f"{uid}.yaml")
-        
         config = {
-            'port': port,
-            'socks-port': port + 1,
+            'mixed-port': port,  # HTTP and SOCKS5, whichever PROBE_PROTOCOL speaks
+            'socks-port': socks_port,
             'allow-lan': False,
             'mode': 'global',
             'log-level': 'silent',
             'external-controller': f'127.0.0.1:{ctrl_port}',
-            'proxies': [proxy_to_clash_format(proxy)],
+            'proxies': [clash_proxy(proxy)],
             'proxy-groups': [{
                 'name': 'PROXY',
                 'type': 'select',
@@ -142,123 +561,539 @@ def test_proxy_ultra(proxy: Dict, clash_bin: str, temp_dir: str,
             'rules': ['MATCH,PROXY']
         }
         
-        with open(cfg, 'w', encoding='utf-8') as f:
-            yaml.dump(config, f)
-        
-        proc = quick_clash_start(cfg, clash_bin, port, ctrl_port)
-        if not proc:
-            return False, 0
-        
-        success, latency = ultra_fast_test(port, timeout)
-        
-        return success, latency
+        with clash_core(config, clash_bin, temp_dir, '', port, ctrl_port) as proc:
+            if not proc:
+                return False, 0, 'start'
+            return ultra_fast_test(port, timeout, tier)
         
     except:
-        return False, 0
+        return False, 0, 'probe'
     finally:
-        if proc:
-            try:
-                proc.kill()
-            except:
-                pass
-        
+        port_mgr.release(*ports)
+
+
+def build_listener_config(proxies: List[Dict], ports: List[int], ctrl_port: int) -> Dict:
+    """One Clash config serving every proxy on its own mixed listener"""
+    clash_proxies = []
+    listeners = []
+    for i, proxy in enumerate(proxies):
+        entry = clash_proxy(proxy)
+        entry['name'] = f'p{i}'  # Names must be unique inside one core
+        clash_proxies.append(entry)
+        listeners.append({
+            'name': f'in{i}',
+            'type': 'mixed',
+            'listen': '127.0.0.1',
+            'port': ports[i],
+            'proxy': f'p{i}'
+        })
+    
+    return {
+        'allow-lan': False,
+        'mode': 'rule',
+        'log-level': 'silent',
+        'external-controller': f'127.0.0.1:{ctrl_port}',
+        'proxies': clash_proxies,
+        'listeners': listeners,
+        'rules': ['MATCH,DIRECT']
+    }
+
+
+@contextmanager
+def listener_core(proxies: List[Dict], clash_bin: str, temp_dir: str,
+                  port_mgr: FastPortManager):
+    """
+    Run one Clash process with a mixed listener per proxy.
+    Yields the listener ports in proxy order, or None if the core did not
+    come up; the core is stopped and its ports reclaimed on exit.
+    """
+    # N listener ports plus the controller port
+    ports = port_mgr.acquire_many(len(proxies) + 1)
+    if not ports:
+        yield None
+        return
+    
+    listen_ports, ctrl_port = ports[:-1], ports[-1]
+    
+    try:
+        config = build_listener_config(proxies, listen_ports, ctrl_port)
+        # mihomo opens listeners in no fixed order: wait for every one
+        with clash_core(config, clash_bin, temp_dir, 'batch_', listen_ports, ctrl_port) as proc:
+            yield listen_ports if proc else None
+    finally:
+        port_mgr.release(*ports)
+
+
+def bisect_core_failures(proxies: List[Dict], run, failed) -> list:
+    """
+    Per-proxy results of run(chunk), which returns None when the chunk's
+    core did not come up. mihomo refuses a whole config over one proxy it
+    cannot load, so a failed chunk is halved until the bad proxies are
+    isolated; only they get `failed`.
+    """
+    results = run(proxies)
+    if results is not None:
+        return results
+    if len(proxies) == 1:
+        return [failed]
+    mid = len(proxies) // 2
+    return (bisect_core_failures(proxies[:mid], run, failed) +
+            bisect_core_failures(proxies[mid:], run, failed))
+
+
+def test_batch_listeners(proxies: List[Dict], clash_bin: str, temp_dir: str,
+                         port_mgr: FastPortManager, timeout: int,
+                         tier: Optional[TestTier] = None) -> List[Tuple[bool, float, str]]:
+    """Test a chunk of proxies through one Clash process, one listener each"""
+    def run(chunk):
+        with listener_core(chunk, clash_bin, temp_dir, port_mgr) as listen_ports:
+            if not listen_ports:
+                return None
+            
+            if PROBE_ENGINE == 'raw':
+                return raw_probe(listen_ports, timeout, tier)
+            
+            with ThreadPoolExecutor(max_workers=len(chunk)) as executor:
+                return list(executor.map(
+                    lambda port: ultra_fast_test(port, timeout, tier),
+                    listen_ports
+                ))
+    
+    try:
+        return bisect_core_failures(proxies, run, (False, 0, 'start'))
+    except:
+        return [(False, 0, 'probe')] * len(proxies)
+
+
+def build_api_config(proxies: List[Dict], ctrl_port: int) -> Dict:
+    """One Clash config holding a whole batch behind a single group"""
+    clash_proxies = []
+    for i, proxy in enumerate(proxies):
+        entry = clash_proxy(proxy)
+        entry['name'] = f'p{i}'
+        clash_proxies.append(entry)
+    
+    return {
+        'allow-lan': False,
+        'mode': 'global',
+        'log-level': 'silent',
+        'external-controller': f'127.0.0.1:{ctrl_port}',
+        'proxies': clash_proxies,
+        'proxy-groups': [{
+            'name': 'BATCH',
+            'type': 'select',
+            'proxies': [p['name'] for p in clash_proxies]
+        }],
+        'rules': ['MATCH,BATCH']
+    }
+
+
+def api_delay_test(ctrl_port: int, names: List[str], timeout: int,
+                   url: str = API_TEST_URL) -> Dict[str, float]:
+    """
+    Measure delays inside the core through the controller.
+    Tries the group endpoint first (one call for the whole batch),
+    then falls back to per-proxy calls for cores without it (404).
+    Any other error means no proxy in the group answered in time.
+    """
+    base = f'http://127.0.0.1:{ctrl_port}'
+    params = {'url': url, 'timeout': int(timeout * 1000)}
+    session = requests.Session()
+    
+    try:
+        resp = session.get(f'{base}/group/BATCH/delay', params=params, timeout=timeout + 5)
+        if resp.status_code == 200:
+            return {name: float(delay) for name, delay in resp.json().items() if delay}
+        if resp.status_code != 404:
+            return {}
+    except:
+        return {}
+    
+    def single(name):
         try:
-            if 'cfg' in locals():
-                os.remove(cfg)
+            resp = session.get(f'{base}/proxies/{name}/delay', params=params, timeout=timeout + 2)
+            if resp.status_code == 200:
+                return name, float(resp.json().get('delay', 0))
         except:
             pass
+        return name, 0
+    
+    with ThreadPoolExecutor(max_workers=min(len(names), 32)) as executor:
+        return {name: delay for name, delay in executor.map(single, names) if delay}
 
 
-def test_mega_batch(proxies: List[Dict], clash_bin: str, temp_dir: str,
-                   workers: int, timeout: int) -> List[Dict]:
-    """Test mega batch with maximum parallelism"""
-    port_mgr = FastPortManager()
-    working = []
-    lock = threading.Lock()
-    completed = 0
-    total = len(proxies)
+def test_batch_api(proxies: List[Dict], clash_bin: str, temp_dir: str,
+                   port_mgr: FastPortManager, timeout: int,
+                   tier: Optional[TestTier] = None) -> List[Tuple[bool, float, str]]:
+    """
+    Test a chunk of proxies inside one Clash process via the delay API.
+    A tier swaps in its first endpoint and repeats the delay call for its
+    latency samples; the core's API has no HTTPS-only check.
+    """
+    try:
+        return bisect_core_failures(
+            proxies, lambda chunk: api_core_test(chunk, clash_bin, temp_dir, port_mgr, timeout, tier),
+            (False, 0, 'start'))
+    except:
+        return [(False, 0, 'probe')] * len(proxies)
+
+
+def api_core_test(proxies: List[Dict], clash_bin: str, temp_dir: str,
+                  port_mgr: FastPortManager, timeout: int,
+                  tier: Optional[TestTier] = None) -> Optional[List[Tuple[bool, float, str]]]:
+    """One delay-API core over `proxies`; None when the core did not come up"""
+    ctrl_port = port_mgr.acquire()
+    if not ctrl_port:
+        return None
     
-    def test_wrapper(proxy):
-        nonlocal completed
-        success, latency = test_proxy_ultra(proxy, clash_bin, temp_dir, port_mgr, timeout)
-        
-        with lock:
-            completed += 1
-            if completed % 50 == 0 or completed == total:
-                print(f"\r    Progress: {completed}/{total} ({len(working)} working, {completed/total*100:.1f}%)", 
-                      end='', flush=True)
+    try:
+        config = build_api_config(proxies, ctrl_port)
+        with clash_core(config, clash_bin, temp_dir, 'api_', ctrl_port, ctrl_port) as proc:
+            if not proc:
+                return None
+            
+            url = tier.urls[0] if tier else API_TEST_URL
+            names = [f'p{i}' for i in range(len(proxies))]
+            samples = {name: [delay] for name, delay in
+                       api_delay_test(ctrl_port, names, timeout, url).items()}
+            for _ in range((tier.samples if tier else 1) - 1):
+                if not samples:
+                    break
+                for name, delay in api_delay_test(ctrl_port, list(samples), timeout, url).items():
+                    samples[name].append(delay)
+            return [(True, median(samples[name]), '') if name in samples else (False, 0, 'probe')
+                    for name in names]
+    
+    except:
+        return [(False, 0, 'probe')] * len(proxies)
+    finally:
+        port_mgr.release(ctrl_port)
+
+
+class ClashWorker:
+    """One long-lived Clash process whose proxy is swapped by config reload"""
+    
+    def __init__(self, clash_bin: str, temp_dir: str, port: int, ctrl_port: int):
+        self.clash_bin = clash_bin
+        self.temp_dir = temp_dir
+        self.port = port
+        self.ctrl_port = ctrl_port
+        self.cfg = os.path.join(temp_dir, f"worker_{port}.yaml")
+        self.proc = None
+        self.session = requests.Session()
+        self.restarts = 0
+    
+    def build_config(self, proxy: Optional[Dict] = None) -> Dict:
+        config = {
+            'mixed-port': self.port,
+            'allow-lan': False,
+            'mode': 'global',
+            'log-level': 'silent',
+            'external-controller': f'127.0.0.1:{self.ctrl_port}',
+            'proxies': [],
+            'rules': ['MATCH,DIRECT']
+        }
+        if proxy:
+            config['proxies'] = [clash_proxy(proxy)]
+            config['proxy-groups'] = [{
+                'name': 'PROXY',
+                'type': 'select',
+                'proxies': [proxy.get('name', 'proxy')]
+            }]
+            config['rules'] = ['MATCH,PROXY']
+        return config
+    
+    def start(self) -> bool:
+        self.stop()
+        with open(self.cfg, 'w', encoding='utf-8') as f:
+            yaml.dump(self.build_config(), f)
+        self.proc = quick_clash_start(self.cfg, self.clash_bin, self.port, self.ctrl_port)
+        return self.proc is not None
+    
+    def stop(self):
+        stop_clash(self.proc)
+        self.proc = None
+    
+    def healthy(self) -> bool:
+        if not self.proc or self.proc.poll() is not None:
+            return False
+        try:
+            resp = self.session.get(f'http://127.0.0.1:{self.ctrl_port}/version', timeout=1)
+            return resp.status_code == 200
+        except:
+            return False
+    
+    def load(self, proxy: Dict) -> bool:
+        """Hot-swap the proxy through the controller"""
+        payload = yaml.dump(self.build_config(proxy))
+        try:
+            resp = self.session.put(
+                f'http://127.0.0.1:{self.ctrl_port}/configs',
+                params={'force': 'true'},
+                json={'payload': payload},
+                timeout=5
+            )
+            return resp.status_code in [200, 204]
+        except:
+            return False
+    
+    def test(self, proxy: Dict, timeout: int,
+             tier: Optional[TestTier] = None) -> Tuple[bool, float, str]:
+        if not self.load(proxy):
+            # Crashed or wedged core: restart once and retry
+            if self.healthy() or not self.start():
+                return False, 0, 'start'
+            self.restarts += 1
+            if not self.load(proxy):
+                return False, 0, 'start'
+        return ultra_fast_test(self.port, timeout, tier)
+
+
+class ClashWorkerPool:
+    """Warm pool of Clash workers shared by the whole run"""
+    
+    def __init__(self, clash_bin: str, temp_dir: str, size: int):
+        self.port_mgr = PORT_MANAGER
+        self.workers = []
+        self.idle = queue.Queue()
         
-        if success:
-            proxy['latency'] = latency
-            return proxy
-        return None
+        for _ in range(size):
+            ports = self.port_mgr.acquire_many(2)
+            if not ports:
+                break
+            self.workers.append(ClashWorker(clash_bin, temp_dir, *ports))
     
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-        futures = [executor.submit(test_wrapper, p) for p in proxies]
+    def start(self) -> int:
+        """Start every worker in parallel, return how many came up"""
+        with ThreadPoolExecutor(max_workers=min(len(self.workers), 50) or 1) as executor:
+            started = list(executor.map(lambda w: w.start(), self.workers))
         
-        for future in as_completed(futures):
+        for worker, ok in zip(self.workers, started):
+            if not ok:
+                self.port_mgr.release(worker.port, worker.ctrl_port)
+        self.workers = [w for w, ok in zip(self.workers, started) if ok]
+        for worker in self.workers:
+            self.idle.put(worker)
+        return len(self.workers)
+    
+    def test(self, proxy: Dict, timeout: int,
+             tier: Optional[TestTier] = None) -> Tuple[bool, float, str]:
+        worker = self.idle.get()
+        try:
+            if not worker.healthy():
+                worker.restarts += 1
+                if not worker.start():
+                    return False, 0, 'start'
+            return worker.test(proxy, timeout, tier)
+        finally:
+            self.idle.put(worker)
+    
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+            self.port_mgr.release(worker.port, worker.ctrl_port)
             try:
-                result = future.result()
-                if result:
-                    with lock:
-                        working.append(result)
+                os.remove(worker.cfg)
             except:
                 pass
     
-    print()  # New line after progress
-    return working
+    @property
+    def restarts(self) -> int:
+        return sum(w.restarts for w in self.workers)
 
 
-def test_protocol_ultra(ptype: str, proxies: List[Dict], clash_bin: str,
-                       temp_dir: str, workers: int, timeout: int,
-                       batch_size: int) -> List[Dict]:
-    """Test protocol with ultra-fast batching"""
-    print(f"\n{'='*70}")
-    print(f"Testing {ptype.upper()} - {len(proxies)} proxies")
-    print(f"{'='*70}")
+class TestScheduler:
+    """
+    One continuous work queue across every protocol.
+    Each task carries its protocol and timeout; dispatch only blocks while
+    every worker slot is busy, so there are no batch or protocol barriers.
+    """
     
-    all_working = []
-    num_batches = (len(proxies) + batch_size - 1) // batch_size
+    def __init__(self, clash_bin: str, temp_dir: str, workers: int,
+                 cache: Optional[ResultCache] = None,
+                 expected: Optional[Dict[str, int]] = None,
+                 tier: Optional[TestTier] = None):
+        self.clash_bin = clash_bin
+        self.temp_dir = temp_dir
+        self.workers = workers
+        self.cache = cache
+        self.tier = tier
+        self.expected = expected or {}  # ptype -> count, known up front in phased mode
+        self.chunked = TEST_MODE in ('batch', 'api')
+        
+        floor, ceiling = workers, workers
+        if ADAPTIVE and TEST_MODE != 'pool':  # A pool cannot grow past its live cores
+            floor, ceiling = ADAPTIVE_MIN, ADAPTIVE_MAX
+        
+        # Each chunk probes all of its proxies at once, so keep total probes near `workers`
+        per_slot = CLASH_BATCH if self.chunked else 1
+        self.gate = ConcurrencyController(max(1, workers // per_slot),
+                                          max(1, floor // per_slot),
+                                          max(1, ceiling // per_slot),
+                                          adaptive=ADAPTIVE)
+        self.port_mgr = PORT_MANAGER
+        self.pool = None
+        self.executor = None
+        self.lock = threading.Lock()
+        self.buffers = {}
+        self.stats = {}  # ptype -> [done, working]
+        self.working = []
+        self.received = 0
+        self.completed = 0
     
-    for batch_idx in range(num_batches):
-        start_idx = batch_idx * batch_size
-        end_idx = min(start_idx + batch_size, len(proxies))
-        batch = proxies[start_idx:end_idx]
+    def start(self) -> bool:
+        if TEST_MODE == 'pool':
+            self.pool = ClashWorkerPool(self.clash_bin, self.temp_dir, self.workers)
+            live = self.pool.start()
+            print(f"Warm pool: {live} live Clash workers")
+            if not live:
+                return False
+        self.executor = ThreadPoolExecutor(max_workers=self.gate.ceiling)
+        self.gate.start()
+        return True
+    
+    def submit(self, proxy: Dict):
+        """Queue one proxy; blocks while all worker slots are busy"""
+        self.received += 1
+        ptype = proxy.get('type', 'unknown').lower()
         
-        print(f"\n  Batch {batch_idx + 1}/{num_batches}: Testing {len(batch)} configs...")
+        if self.cache:
+            entry = self.cache.lookup(proxy)
+            if entry:
+                if entry.get('ok'):
+                    proxy['latency'] = entry.get('latency', 0)
+                self._record(ptype, [proxy], [(bool(entry.get('ok')), proxy.get('latency', 0), '')],
+                             'cache')
+                return
         
-        working = test_mega_batch(batch, clash_bin, temp_dir, workers, timeout)
-        all_working.extend(working)
+        if not self.chunked:
+            self._dispatch([proxy], ptype)
+            return
         
-        batch_rate = (len(working) / len(batch) * 100)
-        overall_rate = (len(all_working) / end_idx * 100)
+        buf = self.buffers.setdefault(ptype, [])
+        buf.append(proxy)
+        if len(buf) >= CLASH_BATCH:
+            self._dispatch(buf, ptype)
+            self.buffers[ptype] = []
+    
+    def _dispatch(self, items: List[Dict], ptype: str):
+        self.gate.acquire()
+        timeout = self.tier.timeout_for(ptype) if self.tier else PROTOCOL_TIMEOUTS.get(ptype, 10)
+        self.executor.submit(self._run, items, ptype, timeout)
+    
+    def _run(self, items: List[Dict], ptype: str, timeout: int):
+        results = [(False, 0, 'probe')] * len(items)
+        started = time.time()
+        try:
+            if TEST_MODE == 'batch':
+                results = test_batch_listeners(items, self.clash_bin, self.temp_dir,
+                                               self.port_mgr, timeout, self.tier)
+            elif TEST_MODE == 'api':
+                results = test_batch_api(items, self.clash_bin, self.temp_dir,
+                                         self.port_mgr, timeout, self.tier)
+            elif self.pool:
+                results = [self.pool.test(items[0], timeout, self.tier)]
+            else:
+                results = [test_proxy_ultra(items[0], self.clash_bin, self.temp_dir,
+                                            self.port_mgr, timeout, self.tier)]
+            
+            if self.cache:
+                for proxy, (success, latency, _) in zip(items, results):
+                    # A screen pass is not a verdict; the verify tier records it
+                    if success and self.tier and not self.tier.final:
+                        continue
+                    self.cache.record(proxy, success, latency)
+        except:
+            pass
+        finally:
+            self._record(ptype, items, results)
+            timed_out = not any(ok for ok, _, _ in results) and time.time() - started >= timeout
+            self.gate.release(timed_out)
+    
+    def _stage(self, reason: str) -> str:
+        """attempts.stage: the tier (or 'probe') on success, else why it failed"""
+        base = self.tier.name if self.tier else 'probe'
+        if not reason:
+            return base
+        return f'{base}:{reason}' if self.tier else reason
+    
+    def _record(self, ptype: str, items: List[Dict], results: List[Tuple[bool, float, str]],
+                stage: Optional[str] = None):
+        # Queued for the DB writer thread before taking the lock
+        if RESULTS_DB:
+            for proxy, (success, latency, reason) in zip(items, results):
+                RESULTS_DB.record(proxy, success, latency, stage or self._stage(reason))
+        with self.lock:
+            counts = self.stats.setdefault(ptype, [0, 0])
+            for proxy, (success, latency, reason) in zip(items, results):
+                counts[0] += 1
+                if success:
+                    proxy['latency'] = latency
+                    self.working.append(proxy)
+                    counts[1] += 1
+            self.completed += len(items)
+            
+            total = sum(self.expected.values()) or self.received
+            if self.chunked or self.completed % 50 == 0 or self.completed == total:
+                # Overall totals, then this protocol's share (done/total when known up front)
+                proto_total = self.expected.get(ptype)
+                line = (f"\r    Progress: {self.completed}/{total} "
+                        f"({len(self.working)} working, {self.completed/max(total, 1)*100:.1f}%) | "
+                        f"{ptype.upper()} {counts[0]}" + (f"/{proto_total}" if proto_total else '')
+                        + f" ({counts[1]} working)")
+                print(line.ljust(80), end='', flush=True)
+            
+            if counts[0] == self.expected.get(ptype):
+                print(f"\n  {ptype.upper()} Final: {counts[1]}/{counts[0]} "
+                      f"({counts[1]/counts[0]*100:.1f}%)")
+    
+    def finish(self) -> List[Dict]:
+        """Flush partial chunks, wait for every task and stop the pool"""
+        try:
+            for ptype, buf in self.buffers.items():
+                if buf:
+                    self._dispatch(buf, ptype)
+            self.buffers = {}
+        finally:
+            if self.executor:
+                self.executor.shutdown(wait=True)
+            self.gate.stop()
+            if self.gate.adaptive:
+                self.save_trajectory()
+            if self.pool:
+                print(f"\nWarm pool: {self.pool.restarts} worker restarts")
+                self.pool.stop()
         
-        print(f"  Batch result: {len(working)}/{len(batch)} ({batch_rate:.1f}%)")
-        print(f"  Total so far: {len(all_working)}/{end_idx} ({overall_rate:.1f}%)")
+        print()  # New line after progress
+        # Protocols whose size was not known up front (streaming)
+        for ptype, (done, ok) in sorted(self.stats.items()):
+            if ptype not in self.expected:
+                print(f"  {ptype.upper()} Final: {ok}/{done} ({ok/done*100:.1f}%)")
         
-        time.sleep(0.3)
+        return self.working
     
-    print(f"\n  {ptype.upper()} Final: {len(all_working)}/{len(proxies)} ({len(all_working)/len(proxies)*100:.1f}%)")
-    return all_working
+    def save_trajectory(self):
+        path = os.path.join(self.temp_dir, 'concurrency_log.json')
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.gate.trajectory, f, indent=2)
+            limits = [e['limit'] for e in self.gate.trajectory]
+            print(f"\nConcurrency: {len(limits)} log entries, limit range {min(limits)}-{max(limits)} "
+                  f"slots, log in {path}")
+        except Exception as e:
+            print(f"\n⚠ Could not save concurrency log: {e}")
 
 
-def test_all_ultra(proxies: List[Dict], clash_bin: str, temp_dir: str) -> List[Dict]:
+def test_all_ultra(proxies: List[Dict], clash_bin: str, temp_dir: str,
+                   tier: Optional[TestTier] = None,
+                   cache: Optional[ResultCache] = None) -> List[Dict]:
     """Ultimate testing strategy"""
     
     total = len(proxies)
     
     # Ultra-aggressive settings for speed
-    workers = min(int(os.environ.get('TEST_WORKERS', 150)), 200)
-    batch_size = min(int(os.environ.get('BATCH_SIZE', 300)), 500)
-    
-    # Protocol-specific timeouts
-    timeouts = {
-        'ss': 8,        # SS is usually fast
-        'vmess': 10,    # VMess needs more time
-        'vless': 12,    # VLESS needs most time
-        'trojan': 10,   # Trojan moderate
-        'ssr': 8
-    }
+    workers = tier.workers if tier else min(int(os.environ.get('TEST_WORKERS', 150)), 200)
+    timeout_for = tier.timeout_for if tier else lambda ptype: PROTOCOL_TIMEOUTS.get(ptype, 10)
     
     # Group by protocol
     groups = {}
@@ -267,95 +1102,326 @@ def test_all_ultra(proxies: List[Dict], clash_bin: str, temp_dir: str) -> List[D
         groups.setdefault(ptype, []).append(proxy)
     
     print(f"\n{'='*70}")
-    print(f"ULTIMATE SPEED MODE")
+    print(f"ULTIMATE SPEED MODE" + (f" - {tier.name.upper()} TIER" if tier else ""))
     print(f"{'='*70}")
     print(f"Total: {total} proxies")
-    print(f"Max Workers: {workers} | Max Batch: {batch_size}")
-    print(f"Strategy: Maximum parallelism with adaptive timeouts")
+    print(f"Max Workers: {workers}")
+    if ADAPTIVE:
+        print(f"Adaptive concurrency: {ADAPTIVE_MIN}-{ADAPTIVE_MAX} in-flight tests")
+    if TEST_MODE in ('batch', 'api'):
+        print(f"Mode: {TEST_MODE} ({CLASH_BATCH} proxies per Clash process)")
+    print(f"Strategy: One continuous scheduler across all protocols")
     print(f"\nProtocol Distribution:")
     for ptype, plist in sorted(groups.items()):
-        timeout = timeouts.get(ptype, 10)
-        print(f"  {ptype.upper()}: {len(plist)} (timeout: {timeout}s)")
+        timeout = timeout_for(ptype)
+        print(f"  {ptype.upper()}: {len(plist)} (timeout: {timeout:g}s)")
     print(f"{'='*70}")
     
-    all_working = []
+    scheduler = TestScheduler(clash_bin, temp_dir, workers, cache,
+                              expected={ptype: len(plist) for ptype, plist in groups.items()},
+                              tier=tier)
+    if not scheduler.start():
+        return []
     
-    # Test each protocol
-    for ptype, plist in sorted(groups.items()):
-        timeout = timeouts.get(ptype, 10)
+    try:
+        # Slowest protocols first, so the run does not end on a tail of long timeouts
+        order = sorted(groups, key=lambda ptype: (-timeout_for(ptype), ptype))
+        for ptype in order:
+            for proxy in groups[ptype]:
+                scheduler.submit(proxy)
+    finally:
+        working = scheduler.finish()
+    
+    return working
+
+
+def test_stream(source: queue.Queue, clash_bin: str, temp_dir: str,
+                cache: Optional[ResultCache] = None,
+                tier: Optional[TestTier] = None) -> Tuple[List[Dict], int]:
+    """
+    Test proxies as they arrive on `source` until a None sentinel.
+    Dispatch blocks while all workers are busy, so the bounded source
+    queue pushes back on the downloader instead of growing.
+    With a result cache, fresh entries are merged without testing.
+    Returns (working proxies, number received).
+    """
+    workers = tier.workers if tier else min(int(os.environ.get('TEST_WORKERS', 150)), 200)
+    
+    print(f"\n{'='*70}")
+    print(f"STREAMING MODE" + (f" - {tier.name.upper()} TIER" if tier else ""))
+    print(f"{'='*70}")
+    print(f"Max Workers: {workers} | Queue: {STREAM_QUEUE} | Mode: {TEST_MODE}")
+    print(f"{'='*70}")
+    
+    scheduler = TestScheduler(clash_bin, temp_dir, workers, cache, tier=tier)
+    if not scheduler.start():
+        while source.get() is not None:
+            pass
+        return [], 0
+    
+    try:
+        while True:
+            proxy = source.get()
+            if proxy is None:
+                break
+            scheduler.submit(proxy)
+    finally:
+        working = scheduler.finish()
+    
+    return working, scheduler.received
+
+
+TIER_STATS = []  # One entry per tier that ran, in order
+
+
+def record_tier(tier: TestTier, tested: int, passed: int, seconds: float):
+    TIER_STATS.append({
+        'tier': tier.name,
+        'tested': tested,
+        'passed': passed,
+        'pass_rate': round(passed / tested * 100, 1) if tested else 0,
+        'seconds': round(seconds, 1),
+        'workers': tier.workers,
+        'timeout': tier.timeout or 'per-protocol',
+        'endpoints': len(tier.urls),
+        'https': tier.https,
+        'samples': tier.samples
+    })
+
+
+def verify_survivors(proxies: List[Dict], clash_bin: str, temp_dir: str,
+                     cache: Optional[ResultCache] = None) -> List[Dict]:
+    """Second tier: the full multi-endpoint check on screen survivors"""
+    tier = verify_tier()
+    start = time.time()
+    working = test_all_ultra(proxies, clash_bin, temp_dir, tier, cache) if proxies else []
+    record_tier(tier, len(proxies), len(working), time.time() - start)
+    return working
+
+
+def test_tiered(proxies: List[Dict], clash_bin: str, temp_dir: str) -> List[Dict]:
+    """Screen everything with one short probe, then verify the survivors"""
+    tier = screen_tier()
+    start = time.time()
+    survivors = test_all_ultra(proxies, clash_bin, temp_dir, tier)
+    record_tier(tier, len(proxies), len(survivors), time.time() - start)
+    return verify_survivors(survivors, clash_bin, temp_dir)
+
+
+def profile_latency(proxies: List[Dict], clash_bin: str, temp_dir: str,
+                    samples: int = PROFILE_SAMPLES) -> int:
+    """
+    Steady-state latency pass over working proxies.
+    Each proxy gets `samples` requests on one warm connection; the result is
+    stored as `latency_profile` next to `latency`. Returns how many profiled.
+    """
+    chunks = [proxies[i:i + CLASH_BATCH] for i in range(0, len(proxies), CLASH_BATCH)]
+    print(f"\nLatency profile: {len(proxies)} proxies, {samples} samples each "
+          f"({PROFILE_URL})")
+    start = time.time()
+    
+    def profile_chunk(chunk):
+        with listener_core(chunk, clash_bin, temp_dir, PORT_MANAGER) as listen_ports:
+            if not listen_ports:
+                return None
+            return get_engine().profile_many(listen_ports, PROFILE_URL, samples, PROFILE_TIMEOUT)
+    
+    def run(chunk):
+        try:
+            profiles = bisect_core_failures(chunk, profile_chunk, None)
+        except:
+            return 0
         
-        working = test_protocol_ultra(
-            ptype, plist, clash_bin, temp_dir, 
-            workers, timeout, batch_size
-        )
+        done = 0
+        for proxy, profile in zip(chunk, profiles):
+            if profile:
+                proxy['latency_profile'] = profile
+                done += 1
+        return done
+    
+    with ThreadPoolExecutor(max_workers=PROFILE_WORKERS) as executor:
+        profiled = sum(executor.map(run, chunks))
+    
+    print(f"  Profiled: {profiled}/{len(proxies)} in {time.time() - start:.1f}s")
+    return profiled
+
+
+def ranking_latency(proxy: Dict) -> float:
+    """Steady-state median when profiled, otherwise the single probe latency"""
+    profile = proxy.get('latency_profile')
+    if profile:
+        return profile['median_ms']
+    return proxy.get('latency', 999999)
+
+
+def profile_stats(proxies: List[Dict]) -> Optional[Dict]:
+    profiles = [p['latency_profile'] for p in proxies if p.get('latency_profile')]
+    if not profiles:
+        return None
+    
+    def middle(key):
+        return round(median([pr[key] for pr in profiles]), 2)
+    
+    return {
+        'profiled': len(profiles),
+        'samples': PROFILE_SAMPLES,
+        'url': PROFILE_URL,
+        'median_of_median_ms': middle('median_ms'),
+        'median_of_p90_ms': middle('p90_ms'),
+        'median_jitter_ms': middle('jitter_ms'),
+        'median_connect_ms': middle('connect_ms'),
+        'median_first_byte_ms': middle('first_byte_ms')
+    }
+
+
+def throughput_test(proxies: List[Dict], clash_bin: str, temp_dir: str,
+                    top_k: int = THROUGHPUT_TOP_K) -> int:
+    """
+    Download THROUGHPUT_URL through the top-K proxies by latency and store
+    `throughput` (mbps, ttfb_ms, bytes, seconds). Only THROUGHPUT_CONCURRENCY
+    downloads run at once so they do not share the runner's bandwidth.
+    """
+    top = sorted(proxies, key=ranking_latency)[:top_k]
+    print(f"\nThroughput: top {len(top)} proxies, {THROUGHPUT_CONCURRENCY} at a time "
+          f"({THROUGHPUT_URL})")
+    start = time.time()
+    measured = 0
+    
+    def download_chunk(chunk):
+        with listener_core(chunk, clash_bin, temp_dir, PORT_MANAGER) as listen_ports:
+            if not listen_ports:
+                return None
+            return get_engine().throughput_many(listen_ports, THROUGHPUT_URL,
+                                                THROUGHPUT_TIMEOUT, THROUGHPUT_CONCURRENCY)
+    
+    for i in range(0, len(top), CLASH_BATCH):
+        chunk = top[i:i + CLASH_BATCH]
+        try:
+            results = bisect_core_failures(chunk, download_chunk, None)
+        except:
+            continue
         
-        all_working.extend(working)
-        time.sleep(0.5)
+        for proxy, result in zip(chunk, results):
+            if result:
+                proxy['throughput'] = result
+                measured += 1
     
-    return all_working
+    print(f"  Measured: {measured}/{len(top)} in {time.time() - start:.1f}s")
+    return measured
 
 
-def save_results(proxies: List[Dict], output_dir: str):
-    """Save results"""
+def save_results(proxies: List[Dict], output_dir: str, diff: bool = False) -> Optional[Dict]:
+    """
+    Save results.
+    With diff, files keep a stable order, are only replaced when their
+    content changed, and the delta against the last outputs is returned.
+    """
     os.makedirs(output_dir, exist_ok=True)
+    json_path = os.path.join(output_dir, 'working_proxies.json')
     
-    # JSON
-    with open(os.path.join(output_dir, 'working_proxies.json'), 'w', encoding='utf-8') as f:
-        json.dump(proxies, f, indent=2, ensure_ascii=False)
+    if diff:
+        proxies = sorted(proxies, key=calculate_proxy_hash)
+    else:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(proxies, f, indent=2, ensure_ascii=False, default=json_default)
     
-    # By protocol
-    by_proto_dir = os.path.join(output_dir, 'by_protocol')
-    os.makedirs(by_proto_dir, exist_ok=True)
+    # Every output line comes from one share URL per proxy, built once
+    urls = [share_url(proxy) for proxy in proxies]
+    ranking = [ranking_latency(proxy) for proxy in proxies]
+    delta = None
+    if diff:
+        ranking, delta = diff_previous(load_previous(output_dir),
+                                       [calculate_proxy_hash(p) for p in proxies], ranking)
     
-    protocols = {}
-    for proxy in proxies:
+    protocols = {}   # ptype -> proxy count
+    by_proto = {}    # ptype -> lines
+    all_lines = []
+    for proxy, url in zip(proxies, urls):
         ptype = proxy.get('type', 'unknown')
-        protocols.setdefault(ptype, []).append(proxy)
-    
-    for ptype, plist in protocols.items():
-        with open(os.path.join(by_proto_dir, f'{ptype}.txt'), 'w', encoding='utf-8') as f:
-            for proxy in plist:
-                from utils import proxy_to_share_url
-                url = proxy_to_share_url(proxy)
-                if url:
-                    f.write(url + '\n')
-    
-    # All proxies
-    with open(os.path.join(output_dir, 'all_working.txt'), 'w', encoding='utf-8') as f:
-        for proxy in proxies:
-            from utils import proxy_to_share_url
-            url = proxy_to_share_url(proxy)
-            if url:
-                f.write(url + '\n')
-    
-    # Sort by latency
-    sorted_proxies = sorted(proxies, key=lambda x: x.get('latency', 999999))
-    with open(os.path.join(output_dir, 'sorted_by_latency.txt'), 'w', encoding='utf-8') as f:
-        for proxy in sorted_proxies:
-            from utils import proxy_to_share_url
-            url = proxy_to_share_url(proxy)
-            latency = proxy.get('latency', 0)
-            if url:
-                f.write(f"{url} # {latency:.0f}ms\n")
+        protocols[ptype] = protocols.get(ptype, 0) + 1
+        lines = by_proto.setdefault(ptype, [])
+        if url:
+            lines.append(url + '\n')
+            all_lines.append(url + '\n')
+    
+    latency_lines = [f"{urls[i]} # {ranking[i]:.0f}ms\n"
+                     for i in sorted(range(len(proxies)), key=ranking.__getitem__) if urls[i]]
+    
+    # Sort by throughput (only proxies that went through --throughput)
+    measured = sorted((i for i, p in enumerate(proxies) if p.get('throughput')),
+                      key=lambda i: proxies[i]['throughput']['mbps'], reverse=True)
+    throughput_lines = [f"{urls[i]} # {proxies[i]['throughput']['mbps']:.1f}Mbps "
+                        f"{proxies[i]['throughput']['ttfb_ms']:.0f}ms\n"
+                        for i in measured if urls[i]]
+    measured = [proxies[i] for i in measured]
+    
+    by_proto_dir = os.path.join(output_dir, 'by_protocol')
+    os.makedirs(by_proto_dir, exist_ok=True)
+    outputs = {os.path.join(by_proto_dir, f'{ptype}.txt'): lines for ptype, lines in by_proto.items()}
+    outputs[os.path.join(output_dir, 'all_working.txt')] = all_lines
+    outputs[os.path.join(output_dir, 'sorted_by_latency.txt')] = latency_lines
+    # Without measurements the ranking is dropped, not left over from an older run
+    throughput_path = os.path.join(output_dir, 'sorted_by_throughput.txt')
+    if measured:
+        outputs[throughput_path] = throughput_lines
+    if diff:
+        # Published latencies only, so an unchanged run leaves the file alone
+        outputs[json_path] = [json.dumps([published_record(p, r) for p, r in zip(proxies, ranking)],
+                                         indent=2, ensure_ascii=False, default=json_default)]
+        written = [p for p, lines in outputs.items() if write_if_changed(p, ''.join(lines))]
+        stale = [p for p in glob.glob(os.path.join(by_proto_dir, '*.txt')) if p not in outputs]
+        if not measured and os.path.exists(throughput_path):
+            stale.append(throughput_path)
+        for path in stale:
+            os.remove(path)
+        delta.update({
+            'files_written': sorted(os.path.relpath(p, output_dir) for p in written),
+            'files_unchanged': len(outputs) - len(written),
+            'files_removed': sorted(os.path.relpath(p, output_dir) for p in stale),
+        })
+    else:
+        for path, lines in outputs.items():
+            with open(path, 'w', encoding='utf-8', buffering=OUTPUT_BUFFER) as f:
+                f.writelines(lines)
+        if not measured and os.path.exists(throughput_path):
+            os.remove(throughput_path)
     
     # Metadata
-    latencies = [p.get('latency', 0) for p in proxies if p.get('latency', 0) > 0]
+    if diff:
+        latencies = [r for r in ranking if r > 0]
+    else:
+        latencies = [p.get('latency', 0) for p in proxies if p.get('latency', 0) > 0]
     metadata = {
         'total_working': len(proxies),
-        'by_protocol': {ptype: len(plist) for ptype, plist in protocols.items()},
+        'by_protocol': protocols,
         'latency_stats': {
             'average_ms': round(sum(latencies) / len(latencies), 2) if latencies else 0,
             'min_ms': round(min(latencies), 2) if latencies else 0,
             'max_ms': round(max(latencies), 2) if latencies else 0,
             'median_ms': round(sorted(latencies)[len(latencies)//2], 2) if latencies else 0
         },
+        'latency_profile_stats': profile_stats(proxies),
+        'throughput_stats': {
+            'measured': len(measured),
+            'url': THROUGHPUT_URL,
+            'max_mbps': measured[0]['throughput']['mbps'],
+            'median_mbps': measured[len(measured)//2]['throughput']['mbps']
+        } if measured else None,
         'test_method': 'ultra_fast',
+        'clash_startup': STARTUP_STATS.summary(),
+        'tiers': TIER_STATS or None,
+        'delta': delta,
         'test_date': datetime.now().isoformat(),
         'timestamp': int(time.time())
     }
     
-    with open(os.path.join(output_dir, 'metadata.json'), 'w', encoding='utf-8') as f:
-        json.dump(metadata, f, indent=2)
+    metadata_path = os.path.join(output_dir, 'metadata.json')
+    if diff:
+        write_metadata_if_changed(metadata_path, metadata)
+    else:
+        with open(metadata_path, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, indent=2)
+    return delta
 
 
 def find_clash() -> Optional[str]:
@@ -376,43 +1442,78 @@ def find_clash() -> Optional[str]:
     return None
 
 
-def remove_duplicates(proxies: List[Dict]) -> List[Dict]:
+def remove_duplicates(proxies: Iterable[Dict], by_ip: bool = False) -> List[Dict]:
+    """Keep the first proxy per hash; `proxies` may be a lazy iterator"""
     seen = set()
     unique = []
+    total = 0
     
     for proxy in proxies:
-        h = calculate_proxy_hash(proxy)
+        total += 1
+        h = calculate_proxy_hash(proxy, by_ip)
         if h not in seen:
             seen.add(h)
             unique.append(proxy)
     
-    if len(proxies) != len(unique):
-        print(f"Removed {len(proxies) - len(unique)} duplicates")
+    if total != len(unique):
+        print(f"Removed {total - len(unique)} duplicates")
     
     return unique
 
 
-def main():
-    print("="*70)
-    print("ULTIMATE Proxy Tester - Maximum Speed & Accuracy")
-    print("="*70 + "\n")
+def run_stream(clash_bin: str, temp_dir: str, cache: Optional[ResultCache] = None,
+               tiered: bool = False) -> Tuple[List[Dict], int]:
+    """Download, parse, dedupe and test in one overlapping pipeline"""
+    from download_subscriptions import SubscriptionDownloader
     
-    base_dir = os.path.dirname(os.path.dirname(__file__))
-    temp_dir = os.path.join(base_dir, 'temp_configs')
-    output_dir = os.path.join(base_dir, 'working_configs')
+    downloader = SubscriptionDownloader()
+    urls = downloader.read_subscription_urls()
     
-    # Load proxies
-    proxies_file = os.path.join(temp_dir, 'parsed_proxies.json')
-    if not os.path.exists(proxies_file):
-        print(f"Error: {proxies_file} not found")
-        sys.exit(1)
+    source = queue.Queue(maxsize=STREAM_QUEUE)
+    producer = threading.Thread(target=downloader.stream_proxies, args=(urls, source),
+                                daemon=True)
+    producer.start()
+    
+    if tiered:
+        tier = screen_tier()
+        start = time.time()
+        survivors, tested = test_stream(source, clash_bin, temp_dir, cache, tier)
+        record_tier(tier, tested, len(survivors), time.time() - start)
+        producer.join()
+        working = verify_survivors(survivors, clash_bin, temp_dir, cache)
+    else:
+        working, tested = test_stream(source, clash_bin, temp_dir, cache)
+        producer.join()
     
-    with open(proxies_file, 'r', encoding='utf-8') as f:
-        proxies = json.load(f)
+    downloader.save_stats(downloader.total_urls, downloader.unique_count, temp_dir)
+    return working, tested
+
+
+def record_dropped(before: List[Dict], after: List[Dict], stage: str):
+    """Log proxies a pre-stage eliminated as failed attempts at that stage"""
+    if not RESULTS_DB:
+        return
+    kept = {id(p) for p in after}
+    for proxy in before:
+        if id(proxy) not in kept:
+            RESULTS_DB.record(proxy, False, 0, stage)
+
+
+def load_and_test(temp_dir: str, cache: Optional[ResultCache] = None,
+                  prefilter: bool = False, resolve: bool = False,
+                  dedupe_ip: bool = False,
+                  tiered: bool = False) -> Tuple[List[Dict], int, float]:
+    """Phased mode: test everything in parsed_proxies.{ndjson,ndjson.gz,json}"""
+    # Load proxies, deduping while the file streams in
+    proxies_file = find_parsed(temp_dir)
+    if not proxies_file:
+        print(f"Error: no parsed_proxies file in {temp_dir}")
+        sys.exit(1)
     
-    print(f"Loaded: {len(proxies)} proxies")
+    print(f"Loading: {proxies_file}")
     
-    proxies = remove_duplicates(proxies)
+    # Held as compact records for the whole run; see benchmark.py memory
+    proxies = remove_duplicates(map(ProxyRecord, iter_proxies(proxies_file)))
     print(f"Unique: {len(proxies)} proxies\n")
     
     if not proxies:
@@ -426,20 +1527,69 @@ def main():
     
     print(f"Clash: {clash_bin}")
     
+    total = len(proxies)
+    cached_working = []
+    if cache:
+        proxies, cached_working, cached_failed = split_cached(proxies, cache)
+        print(f"Incremental: {len(cached_working)} cached working, "
+              f"{cached_failed} cached failures skipped, {len(proxies)} to test")
+        if RESULTS_DB:
+            for proxy in cached_working:
+                RESULTS_DB.record(proxy, True, proxy.get('latency', 0), 'cache')
+    
     # Test
     start_time = time.time()
-    working = test_all_ultra(proxies, clash_bin, temp_dir)
+    candidates = proxies
+    untested = set()  # ids of IP aliases deduped away and DNS timeouts, never tested
+    if (resolve or dedupe_ip) and candidates:
+        resolved = dns_prefilter(candidates, DNSCache(os.path.join(temp_dir, 'dns_cache.json')),
+                                 timed_out=untested)
+        record_dropped(candidates, resolved, 'dns')
+        candidates = resolved
+        if dedupe_ip:
+            deduped = remove_duplicates(candidates, by_ip=True)
+            kept = {id(p) for p in deduped}
+            untested |= {id(p) for p in candidates if id(p) not in kept}
+            candidates = deduped
+    if prefilter and candidates:
+        reachable = tcp_prefilter(candidates)
+        record_dropped(candidates, reachable, 'tcp')
+        candidates = reachable
+    if not candidates:
+        working = []
+    elif tiered:
+        working = test_tiered(candidates, clash_bin, temp_dir)
+    else:
+        working = test_all_ultra(candidates, clash_bin, temp_dir)
     elapsed = time.time() - start_time
     
+    if cache:
+        working_ids = {id(p) for p in working}
+        for proxy in proxies:
+            if id(proxy) not in untested:
+                cache.record(proxy, id(proxy) in working_ids, proxy.get('latency', 0))
+    
+    return cached_working + working, total, elapsed
+
+
+def report_and_save(working: List[Dict], tested: int, elapsed: float, output_dir: str,
+                    diff: bool = False):
     # Results
     print(f"\n{'='*70}")
     print(f"FINAL RESULTS")
     print(f"{'='*70}")
-    print(f"Total Tested:    {len(proxies)}")
+    print(f"Total Tested:    {tested}")
     print(f"Working Proxies: {len(working)}")
-    print(f"Success Rate:    {len(working)/len(proxies)*100:.1f}%")
+    print(f"Success Rate:    {len(working)/tested*100:.1f}%")
     print(f"Time Elapsed:    {elapsed:.0f}s ({elapsed/60:.1f} minutes)")
-    print(f"Test Speed:      {len(proxies)/elapsed:.1f} proxies/second")
+    print(f"Test Speed:      {tested/max(elapsed, 0.001):.1f} proxies/second")
+    STARTUP_STATS.report()
+    
+    if TIER_STATS:
+        print(f"\nTiers:")
+        for t in TIER_STATS:
+            print(f"  {t['tier'].upper():<8} {t['passed']}/{t['tested']} passed "
+                  f"({t['pass_rate']}%) in {t['seconds']:.0f}s")
     
     if working:
         print(f"\nBy Protocol:")
@@ -459,24 +1609,136 @@ def main():
             print(f"  Min:     {min(latencies):.0f}ms")
             print(f"  Max:     {max(latencies):.0f}ms")
             print(f"  Median:  {sorted(latencies)[len(latencies)//2]:.0f}ms")
+        
+        stats = profile_stats(working)
+        if stats:
+            print(f"\nSteady-State Profile ({stats['profiled']} proxies, medians):")
+            print(f"  Latency:    {stats['median_of_median_ms']:.0f}ms "
+                  f"(p90 {stats['median_of_p90_ms']:.0f}ms)")
+            print(f"  Jitter:     {stats['median_jitter_ms']:.0f}ms")
+            print(f"  Connect:    {stats['median_connect_ms']:.0f}ms (first byte minus warm median)")
+            print(f"  First byte: {stats['median_first_byte_ms']:.0f}ms")
     
     print(f"{'='*70}\n")
     
     # Save
     if working:
-        save_results(working, output_dir)
+        delta = save_results(working, output_dir, diff)
         print(f"✓ Saved {len(working)} working proxies")
         print(f"  Location: {output_dir}/")
         print(f"  Files:")
         print(f"    - working_proxies.json")
         print(f"    - all_working.txt")
         print(f"    - sorted_by_latency.txt")
+        if any(p.get('throughput') for p in working):
+            print(f"    - sorted_by_throughput.txt")
         print(f"    - by_protocol/*.txt")
         print(f"    - metadata.json")
+        if delta:
+            print(f"  Delta: +{delta['added']} -{delta['removed']} "
+                  f"~{delta['latency_changed']} latency changed; "
+                  f"{len(delta['files_written'])} files rewritten, {delta['files_unchanged']} unchanged")
     else:
         print("⚠ No working proxies found")
         sys.exit(1)
 
 
+def main():
+    parser = argparse.ArgumentParser(description='Test parsed proxies through Clash')
+    parser.add_argument('--stream', action='store_true',
+                        help='download from sub.txt and test while downloading')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only test proxies without a fresh cached result')
+    parser.add_argument('--prefilter', action='store_true',
+                        help='drop proxies whose server refuses TCP before spawning Clash')
+    parser.add_argument('--resolve', action='store_true',
+                        help='resolve all servers up front, drop unresolvable ones and '
+                             'have Clash dial the resolved IPs')
+    parser.add_argument('--dedupe-ip', action='store_true',
+                        help='resolve servers and test each IP:port endpoint once')
+    parser.add_argument('--tiered', action='store_true',
+                        help='fast one-endpoint screen first, deep verification on survivors')
+    parser.add_argument('--profile', action='store_true',
+                        help='sample steady-state latency and jitter of working proxies')
+    parser.add_argument('--throughput', action='store_true',
+                        help='download a payload through the top-K proxies and rank by Mbps')
+    parser.add_argument('--db', action='store_true',
+                        help='record every attempt in temp_configs/results.db and write outputs from it')
+    parser.add_argument('--from-db', action='store_true',
+                        help='only regenerate outputs from the last run stored in results.db')
+    parser.add_argument('--diff-output', action='store_true',
+                        help='stable line order; only rewrite output files whose content changed')
+    args = parser.parse_args()
+    # The pre-stages work on the whole parsed list, which streaming never holds
+    if args.stream and (args.prefilter or args.resolve or args.dedupe_ip):
+        parser.error('--prefilter, --resolve and --dedupe-ip cannot be combined with --stream')
+
+    print("="*70)
+    print("ULTIMATE Proxy Tester - Maximum Speed & Accuracy")
+    print("="*70 + "\n")
+    
+    base_dir = os.path.dirname(os.path.dirname(__file__))
+    temp_dir = os.path.join(base_dir, 'temp_configs')
+    output_dir = os.path.join(base_dir, 'working_configs')
+    
+    global RESULTS_DB
+    if args.db or args.from_db:
+        RESULTS_DB = ResultsDB(os.environ.get('RESULTS_DB', os.path.join(temp_dir, 'results.db')))
+    
+    if args.from_db:
+        run_id = RESULTS_DB.latest_run()
+        working = RESULTS_DB.working(run_id) if run_id else []
+        RESULTS_DB.close()
+        print(f"Results DB: {len(working)} working proxies from run {run_id}")
+        if working:
+            save_results(working, output_dir, args.diff_output)
+            print(f"✓ Regenerated outputs in {output_dir}/")
+        else:
+            sys.exit(1)
+        return
+    
+    cache = None
+    if args.incremental:
+        cache = ResultCache(os.path.join(temp_dir, 'result_cache.json'))
+        print(f"Result cache: {cache.load(output_dir)} entries "
+              f"(TTL ok {RESULT_TTL_OK}s / fail {RESULT_TTL_FAIL}s)")
+    
+    if args.stream:
+        clash_bin = find_clash()
+        if not clash_bin:
+            print("Error: Clash not found")
+            sys.exit(1)
+        
+        print(f"Clash: {clash_bin}")
+        
+        start_time = time.time()
+        working, tested = run_stream(clash_bin, temp_dir, cache, args.tiered)
+        elapsed = time.time() - start_time
+        
+        if not tested:
+            print("⚠ No proxies downloaded")
+            sys.exit(1)
+    else:
+        working, tested, elapsed = load_and_test(temp_dir, cache, args.prefilter,
+                                                  args.resolve, args.dedupe_ip, args.tiered)
+    
+    if cache:
+        cache.save()
+    
+    if args.profile and working:
+        profile_latency(working, find_clash(), temp_dir)
+    
+    if args.throughput and working:
+        throughput_test(working, find_clash(), temp_dir)
+    
+    if RESULTS_DB:
+        RESULTS_DB.snapshot(working)
+        RESULTS_DB.close(tested, len(working))
+        print(f"\nResults DB: {RESULTS_DB.written} attempts recorded (run {RESULTS_DB.run_id})")
+        working = RESULTS_DB.working(RESULTS_DB.run_id)
+    
+    report_and_save(working, tested, elapsed, output_dir, args.diff_output)
+
+
 if __name__ == '__main__':
     main()
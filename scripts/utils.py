@@ -5,41 +5,132 @@ With improved validation and error handling
 import base64
 import json
 import re
+import sys
 import urllib.parse
-from typing import List, Dict, Optional, Tuple
-from dataclasses import dataclass
+from collections.abc import Mapping
+from typing import Any, Iterable, List, Dict, Optional, Tuple
 import hashlib
 
 
-@dataclass
-class ProxyInfo:
-    """Data class for proxy information"""
-    type: str
-    name: str
-    server: str
-    port: int
-    config: Dict
-    hash: str
+# Low-cardinality values repeated across thousands of proxies
+INTERNED_FIELDS = {'type', 'cipher', 'network', 'server', 'servername', 'sni', 'flow',
+                   'protocol', 'obfs', 'path', 'Host', 'host', 'grpc-service-name'}
 
+_SHAPES = {}  # key tuple -> the one shared copy
 
-def calculate_proxy_hash(proxy: Dict) -> str:
-    """Calculate unique hash for proxy to detect duplicates"""
-    key_fields = f"{proxy.get('type')}:{proxy.get('server')}:{proxy.get('port')}"
+
+def _compact(key: str, value: Any) -> Any:
+    if isinstance(value, dict):
+        return ProxyRecord(value)
+    if isinstance(value, list):
+        return tuple(_compact(key, v) for v in value)
+    if isinstance(value, str) and key in INTERNED_FIELDS:
+        return sys.intern(value)
+    return value
+
+
+def _expand(value: Any) -> Any:
+    if isinstance(value, ProxyRecord):
+        return value.to_dict()
+    if isinstance(value, tuple):
+        return [_expand(v) for v in value]
+    return value
+
+
+class ProxyRecord(Mapping):
+    """
+    Compact form of a proxy dict.
+    The key tuple (the "shape") is shared by every record with the same
+    fields, values sit in one tuple, nested option dicts become records and
+    common strings are interned. The parsed fields are read-only; fields
+    the tester adds later (latency, resolved_ip, ...) go into a small
+    overlay dict. to_dict() gives back the exact dict, key order included.
+    """
+    __slots__ = ('_keys', '_values', '_extra')
+
+    def __init__(self, proxy: Dict):
+        keys = tuple(proxy)
+        self._keys = _SHAPES.setdefault(keys, keys)
+        self._values = tuple(_compact(k, v) for k, v in proxy.items())
+        self._extra = None
+
+    def __getitem__(self, key: str) -> Any:
+        if self._extra and key in self._extra:
+            return self._extra[key]
+        try:
+            return self._values[self._keys.index(key)]
+        except ValueError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key: str, value: Any):
+        if self._extra is None:
+            self._extra = {}
+        self._extra[key] = value
+
+    def __iter__(self):
+        yield from self._keys
+        if self._extra:
+            yield from (k for k in self._extra if k not in self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys) + sum(1 for k in self._extra or () if k not in self._keys)
+
+    def __repr__(self) -> str:
+        return f"ProxyRecord({self.to_dict()!r})"
+
+    def to_dict(self) -> Dict:
+        return {k: _expand(self[k]) for k in self}
+
+
+def pack_proxies(proxies: Iterable[Dict]) -> List[ProxyRecord]:
+    return [ProxyRecord(p) for p in proxies]
+
+
+def unpack_proxies(records: Iterable[ProxyRecord]) -> List[Dict]:
+    return [r.to_dict() for r in records]
+
+
+def json_default(value: Any) -> Any:
+    """json.dump(default=...) hook: records serialize as the dicts they stand for"""
+    if isinstance(value, ProxyRecord):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+# Compiled once; these run for every parsed URL
+IP_RE = re.compile(r'^(\d{1,3}\.){3}\d{1,3}$')
+DOMAIN_RE = re.compile(r'^([a-zA-Z0-9]([a-zA-Z0-9\-]{0,61}[a-zA-Z0-9])?\.)*[a-zA-Z0-9]([a-zA-Z0-9\-]{0,61}[a-zA-Z0-9])?$')
+UUID_RE = re.compile(r'^[a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12}$')
+BASE64_RE = re.compile(r'^[A-Za-z0-9+/]*={0,2}$')
+
+# Pipeline bookkeeping that must never reach a Clash config
+INTERNAL_FIELDS = {'hash', 'resolved_ip', 'connect_ms', 'latency', 'latency_profile', 'throughput',
+                   'source', 'raw_url'}
+
+
+def calculate_proxy_hash(proxy: Dict, by_ip: bool = False) -> str:
+    """
+    Calculate unique hash for proxy to detect duplicates.
+    With by_ip, a resolved IP replaces the server name so domain aliases
+    of one endpoint hash the same.
+    """
+    server = proxy.get('server')
+    if by_ip and proxy.get('resolved_ip'):
+        server = proxy['resolved_ip']
+    key_fields = f"{proxy.get('type')}:{server}:{proxy.get('port')}"
     return hashlib.md5(key_fields.encode()).hexdigest()[:8]
 
 
 def is_valid_domain(domain: str) -> bool:
     """Validate domain name or IP address"""
     # Check for IP address
-    ip_pattern = r'^(\d{1,3}\.){3}\d{1,3}$'
-    if re.match(ip_pattern, domain):
+    if IP_RE.match(domain):
         # Validate IP range
         parts = domain.split('.')
         return all(0 <= int(part) <= 255 for part in parts)
     
     # Check for domain name
-    domain_pattern = r'^([a-zA-Z0-9]([a-zA-Z0-9\-]{0,61}[a-zA-Z0-9])?\.)*[a-zA-Z0-9]([a-zA-Z0-9\-]{0,61}[a-zA-Z0-9])?$'
-    return bool(re.match(domain_pattern, domain)) and len(domain) <= 253
+    return bool(DOMAIN_RE.match(domain)) and len(domain) <= 253
 
 
 def validate_proxy_config(proxy: Dict) -> Tuple[bool, str]:
@@ -79,15 +170,13 @@ def validate_proxy_config(proxy: Dict) -> Tuple[bool, str]:
         if 'uuid' not in proxy or not proxy['uuid']:
             return False, "VMess missing UUID"
         # Validate UUID format
-        uuid_pattern = r'^[a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12}$'
-        if not re.match(uuid_pattern, proxy['uuid'].lower()):
+        if not UUID_RE.match(proxy['uuid'].lower()):
             return False, "Invalid VMess UUID format"
     
     elif ptype == 'vless':
         if 'uuid' not in proxy or not proxy['uuid']:
             return False, "VLESS missing UUID"
-        uuid_pattern = r'^[a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12}$'
-        if not re.match(uuid_pattern, proxy['uuid'].lower()):
+        if not UUID_RE.match(proxy['uuid'].lower()):
             return False, "Invalid VLESS UUID format"
     
     elif ptype in ['ss', 'ssr']:
@@ -126,7 +215,7 @@ def is_base64(s: str) -> bool:
     """Check if string is base64 encoded"""
     try:
         s = s.strip().replace('-', '+').replace('_', '/')
-        if not re.match(r'^[A-Za-z0-9+/]*={0,2}$', s):
+        if not BASE64_RE.match(s):
             return False
         base64.b64decode(s)
         return len(s) > 20  # Avoid false positives
@@ -155,8 +244,7 @@ def parse_vmess(vmess_url: str) -> Optional[Dict]:
             return None
         
         # Validate UUID format
-        uuid_pattern = r'^[a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12}$'
-        if not re.match(uuid_pattern, uuid.lower()):
+        if not UUID_RE.match(uuid.lower()):
             return None
         
         proxy = {
@@ -239,8 +327,7 @@ def parse_vless(vless_url: str) -> Optional[Dict]:
         server = server.strip()
         
         # Validate UUID format
-        uuid_pattern = r'^[a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12}$'
-        if not re.match(uuid_pattern, uuid.lower()):
+        if not UUID_RE.match(uuid.lower()):
             return None
         
         proxy = {
@@ -493,6 +580,15 @@ def parse_ssr(ssr_url: str) -> Optional[Dict]:
         return None
 
 
+PARSERS = {
+    'vmess': parse_vmess,
+    'vless': parse_vless,
+    'ss': parse_ss,
+    'trojan': parse_trojan,
+    'ssr': parse_ssr,
+}
+
+
 def parse_proxy_url(url: str) -> Optional[Dict]:
     """Parse any supported proxy URL with validation"""
     url = url.strip()
@@ -500,25 +596,19 @@ def parse_proxy_url(url: str) -> Optional[Dict]:
     if not url or len(url) < 10:
         return None
     
-    parsers = {
-        'vmess://': parse_vmess,
-        'vless://': parse_vless,
-        'ss://': parse_ss,
-        'trojan://': parse_trojan,
-        'ssr://': parse_ssr,
-    }
-    
-    for prefix, parser in parsers.items():
-        if url.startswith(prefix):
-            proxy = parser(url)
-            if proxy:
-                # Validate configuration
-                is_valid, msg = validate_proxy_config(proxy)
-                if is_valid:
-                    proxy['hash'] = calculate_proxy_hash(proxy)
-                    return proxy
-            return None
+    scheme, sep, _ = url.partition('://')
+    parser = PARSERS.get(scheme) if sep else None
+    if not parser:
+        return None
     
+    proxy = parser(url)
+    if proxy:
+        # Validate configuration
+        is_valid, msg = validate_proxy_config(proxy)
+        if is_valid:
+            proxy['hash'] = calculate_proxy_hash(proxy)
+            proxy['raw_url'] = url  # Exact string as downloaded, for the outputs
+            return proxy
     return None
 
 
@@ -526,10 +616,11 @@ def proxy_to_clash_format(proxy: Dict) -> Dict:
     """Convert proxy to Clash format with cleanup"""
     clash_proxy = {}
     
-    # Copy all non-None values
+    # Copy all non-None values, records and tuples back as plain dicts and lists
     for k, v in proxy.items():
-        if k == 'hash':  # Skip internal fields
+        if k in INTERNAL_FIELDS:  # Skip internal fields
             continue
+        v = _expand(v)
         if v is not None and v != '' and v != {} and v != []:
             clash_proxy[k] = v
     
@@ -558,6 +649,11 @@ def proxy_to_share_url(proxy: Dict) -> str:
     return f"{ptype}://{proxy.get('server')}:{proxy.get('port')}"
 
 
+def share_url(proxy: Dict) -> str:
+    """Original share URL when parsing kept it, else a reconstructed one"""
+    return proxy.get('raw_url') or proxy_to_share_url(proxy)
+
+
 def reconstruct_vmess_url(proxy: Dict) -> str:
     """Reconstruct VMess share URL"""
     config = {